@@ -0,0 +1,55 @@
+"""自動応答トリガー照合のマイクロベンチマーク
+
+従来の `row['trigger'] in content` ループと TriggerMatcher の2つの経路 (ループ / オートマトン) を比較し、
+トリガー数に応じた自動選択 (AUTOMATON_THRESHOLD) がどちらを使うかも表示する。
+実行: python benchmarks/bench_auto_response.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.matcher import AUTOMATON_THRESHOLD, TriggerMatcher
+
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+MESSAGES = 1000
+
+def make_word(rng, lo, hi):
+    return "".join(rng.choice(KANA) for _ in range(rng.randint(lo, hi)))
+
+def loop_match(triggers, content):
+    for index, trigger in enumerate(triggers):
+        if trigger in content:
+            return index
+    return None
+
+def main():
+    rng = random.Random(0)
+    messages = [make_word(rng, 10, 80) for _ in range(MESSAGES)]
+
+    def per_message(fn):
+        return min(timeit.repeat(lambda: [fn(m) for m in messages], number=1, repeat=5)) / MESSAGES * 1e6
+
+    print(f"threshold: {AUTOMATON_THRESHOLD} triggers")
+    print(f"{'triggers':>9} | {'baseline':>9} | {'loop path':>9} | {'automaton':>9} | {'auto':>9} | {'auto uses':>9}  (µs/msg)")
+    for count in (10, 50, 100, 150, 300, 1000):
+        triggers = [make_word(rng, 4, 8) for _ in range(count)]
+        loop_path = TriggerMatcher(triggers, automaton=False)
+        automaton = TriggerMatcher(triggers, automaton=True)
+        auto = TriggerMatcher(triggers)
+
+        # どの経路も結果が従来ループと一致することを確認
+        for content in messages:
+            expected = loop_match(triggers, content)
+            assert loop_path.match(content) == automaton.match(content) == auto.match(content) == expected
+
+        baseline_t = per_message(lambda m: loop_match(triggers, m))
+        loop_t = per_message(loop_path.match)
+        ac_t = per_message(automaton.match)
+        auto_t = per_message(auto.match)
+        uses = "automaton" if auto.automaton else "loop"
+        print(f"{count:>9} | {baseline_t:>9.2f} | {loop_t:>9.2f} | {ac_t:>9.2f} | {auto_t:>9.2f} | {uses:>9}")
+
+if __name__ == "__main__":
+    main()
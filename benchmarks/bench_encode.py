@@ -0,0 +1,66 @@
+"""名言画像のエンコード形式ごとのサイズと時間のベンチマーク
+
+ランダムな写真風アバターと日本語の本文で render_quote と同じ画像を作り、
+形式ごとのエンコード時間・バイト数と、アップロード時間の見積もり (UPLINK_MBPS) を足した
+エンドツーエンドの目安を、従来のフルカラーPNGと比べる。
+自動選択は全形式を試す回と、直近の採用形式だけを使う回 (定常時) を分けて表示する。
+実行: python benchmarks/bench_encode.py
+"""
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils.encode
+from utils.encode import AUTO
+from utils.quote import AVATAR_FETCH_SIZE, render_quote
+
+UPLINK_MBPS = 10
+REPEAT = 5
+
+def make_avatar(rng):
+    # ノイズをぼかしたグラデーション (写真のアバターに近い、圧縮しにくい画像)
+    img = Image.effect_noise((AVATAR_FETCH_SIZE, AVATAR_FETCH_SIZE), 64).convert("RGB")
+    tint = Image.new("RGB", img.size, tuple(rng.randrange(256) for _ in range(3)))
+    img = Image.blend(img, tint, 0.5).filter(ImageFilter.GaussianBlur(2))
+    with io.BytesIO() as buf:
+        img.save(buf, "PNG")
+        return buf.getvalue()
+
+def main():
+    rng = random.Random(0)
+    avatar = make_avatar(rng)
+    text = "明日できることは今日やらなくていい。ただし明後日できることは明日やらなくていい。" * 3
+
+    def run(label, modes, explore):
+        best = None
+        for _ in range(REPEAT):
+            if explore:
+                utils.encode._winners.clear()
+            started = time.perf_counter()
+            image = render_quote(avatar, text, "名無しさん", modes)
+            total = time.perf_counter() - started
+            if best is None or total < best[0]:
+                best = (total, image)
+        total, image = best
+        encode_time = sum(t for _, t, _ in image.timings)
+        upload = len(image.data) * 8 / (UPLINK_MBPS * 1_000_000)
+        rows.append((label, image.format, len(image.data), encode_time, total + upload))
+
+    rows = []
+    for mode in ("png",) + tuple(m for m in AUTO if m != "png"):
+        run(mode, (mode,), False)
+    run("auto (explore)", AUTO, True)
+    run("auto (steady)", AUTO, False)
+
+    print(f"{'modes':<36} {'chosen':<14} {'bytes':>9} {'encode':>9} {'render+upload':>14}")
+    for label, chosen, size, encode_time, end_to_end in rows:
+        print(f"{label:<36} {chosen:<14} {size:>9,} {encode_time * 1000:>7.1f}ms {end_to_end * 1000:>12.1f}ms")
+    print(f"(upload estimated at {UPLINK_MBPS}Mbps)")
+
+if __name__ == "__main__":
+    main()
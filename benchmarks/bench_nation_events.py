@@ -0,0 +1,48 @@
+"""国家イベントの一括処理のマイクロベンチマーク (DBを除いた配列演算部分)
+
+10万か国分の行を列の配列に読み込み、各イベントを適用する時間を測る。
+実行: python benchmarks/bench_nation_events.py
+"""
+import datetime
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.nation_events import EVENTS, apply_event, load_columns
+
+NATIONS = 100_000
+
+def make_rows(rng, now):
+    return [
+        {
+            "user_id": i,
+            "population": rng.randint(100, 500_000),
+            "resources": rng.randint(0, 1_000_000),
+            "army": rng.randint(0, 10_000),
+            "tax_rate": rng.randint(0, 50),
+            "treasury": 0,
+            "last_update": now - datetime.timedelta(seconds=rng.randint(0, 7 * 86400)),
+        }
+        for i in range(NATIONS)
+    ]
+
+def main():
+    rng = random.Random(0)
+    now = datetime.datetime.now()
+    rows = make_rows(rng, now)
+
+    load_t = min(timeit.repeat(lambda: load_columns(rows, now), number=1, repeat=3))
+    print(f"{'step':>10} | {'ms':>8}")
+    print(f"{'load':>10} | {load_t * 1000:8.1f}")
+    for kind in EVENTS:
+        cols = load_columns(rows, now)
+        gen = np.random.default_rng(0)
+        t = min(timeit.repeat(lambda: apply_event(kind, dict(cols), gen), number=1, repeat=5))
+        print(f"{kind:>10} | {t * 1000:8.1f}")
+
+if __name__ == "__main__":
+    main()
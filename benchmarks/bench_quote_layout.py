@@ -0,0 +1,32 @@
+"""名言画像の文字組みのマイクロベンチマーク
+
+500文字の本文を折り返し・自動縮小する時間を、文字幅キャッシュが空の状態 (初回) と
+温まった状態で比べる。フォントは fonts/NotoSansJP-Bold.ttf (無ければPillowのデフォルト)。
+実行: python benchmarks/bench_quote_layout.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.layout import fit_text
+from utils.quote import TEXT_WIDTH, TEXT_HEIGHT, TEXT_SIZES, LINE_SPACING, glyph_widths
+
+CHARS = "あいうえおかきくけこさしすせそたちつてと日本語の文章、。「」ABCabc 123!?ー"
+
+def main():
+    rng = random.Random(0)
+    text = "".join(rng.choice(CHARS) for _ in range(500))
+
+    def layout():
+        return fit_text(text, glyph_widths, TEXT_WIDTH, TEXT_HEIGHT, TEXT_SIZES, LINE_SPACING)
+
+    cold = timeit.timeit(layout, number=1)
+    warm = min(timeit.repeat(layout, number=100, repeat=5)) / 100
+    size, lines = layout()
+    print(f"size={size}px lines={len(lines)}")
+    print(f"cold: {cold * 1000:.2f}ms | warm: {warm * 1000:.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ from discord import app_commands
 from discord.ext import commands
 import random
 import datetime
+import asyncio
+import logging
+from utils.payout import SLOT, EMERALD, slot_multiplier, analyze, format_report
 
 # 定数インポート
 # 注: 本来は from utils.constants import JOBS ですが、ファイル分割の都合上ここに再定義するか参照します
@@ -14,21 +17,64 @@ JOBS = {
     "石油王": {"salary": 50000, "multiplier": 3.0, "desc": "富豪"}
 }
 
+WORK_COOLDOWN = 1800 # 30分
+
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.payout_reports = {} # ゲーム名 -> 分析結果 (/s info 用)
+
+    async def cog_load(self):
+        # 払い戻し率の分析は重いので起動を待たせずバックグラウンドで行う
+        self.payout_task = asyncio.create_task(self.analyze_payouts())
+
+    async def cog_unload(self):
+        self.payout_task.cancel()
 
-    # ユーザーデータ取得・初期化ヘルパー
+    async def analyze_payouts(self):
+        # スレッドで実行 (結果は設定ごとにキャッシュされる)
+        for name, config in (("スロット", SLOT), ("エメラルド", EMERALD)):
+            try:
+                self.payout_reports[name] = await asyncio.to_thread(analyze, config)
+            except Exception as e:
+                logging.error(f"❌ {name}の払い戻し率分析に失敗: {e}")
+
+    # ユーザーデータ取得・初期化ヘルパー (キャッシュ優先。無ければ作成)
     async def get_user_data(self, user_id):
-        data = await self.bot.db.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-        if not data:
-            # 新規ユーザー作成 (debtカラムを含む)
-            await self.bot.db.execute(
-                "INSERT INTO users (id, cash, bank, debt, job_id) VALUES ($1, 0, 0, 0, 'ニート')",
-                user_id
-            )
-            data = await self.bot.db.fetchrow("SELECT * FROM users WHERE id = $1", user_id)
-        return data
+        return await self.bot.bank.get_user(user_id)
+
+    def get_stats(self):
+        stats = self.bot.bank.stats()
+        stats["ランキング"] = self.bot.leaderboard.stats()
+        stats["クールダウン"] = self.bot.cooldowns.stats()
+        stats["定期処理"] = self.bot.maintenance.stats()
+        return stats
+
+    # --- ランキングの維持 ---
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 再接続でも on_ready は呼ばれるので構築は初回だけ
+        if not self.bot.leaderboard.ready:
+            await self.bot.leaderboard.build(self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if member.bot:
+            return
+        worth = await self.bot.db.fetchval("users.net_worth", member.id)
+        self.bot.leaderboard.add_member(member.guild.id, member.id, worth)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.bot.leaderboard.remove_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.bot.leaderboard.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.bot.leaderboard.remove_guild(guild.id)
 
     # --- /s コマンドグループ ---
     s = app_commands.Group(name="s", description="経済・スロットコマンド")
@@ -54,14 +100,19 @@ class Economy(commands.Cog):
 
     @s.command(name="work", description="働いてお金を稼ぎます")
     async def work(self, interaction: discord.Interaction):
+        # クールダウン中ならDBに触れずに返す
+        cooldowns = self.bot.cooldowns
+        remaining = cooldowns.remaining(interaction.user.id, "work")
+        if remaining:
+            return await interaction.response.send_message(f"⏳ 休憩中... あと {int(remaining)//60}分待ってね。", ephemeral=True)
+
         data = await self.get_user_data(interaction.user.id)
         
-        # クールダウンチェック (簡易実装: DBのlast_workを確認)
-        last_work = data['last_work']
+        # 記録が無い (再起動直後など) 場合はDBの last_work から登録
+        remaining = cooldowns.seed(interaction.user.id, "work", data['last_work'], WORK_COOLDOWN)
+        if remaining:
+            return await interaction.response.send_message(f"⏳ 休憩中... あと {int(remaining)//60}分待ってね。", ephemeral=True)
         now = datetime.datetime.now()
-        if last_work and (now - last_work).total_seconds() < 1800: # 30分
-            remaining = int(1800 - (now - last_work).total_seconds())
-            return await interaction.response.send_message(f"⏳ 休憩中... あと {remaining//60}分待ってね。", ephemeral=True)
             
         job_id = data['job_id']
         job_info = JOBS.get(job_id, JOBS["ニート"])
@@ -70,39 +121,30 @@ class Economy(commands.Cog):
         base = random.randint(500, 1500)
         earnings = int((base + job_info['salary']) * job_info['multiplier'])
         
-        await self.bot.db.execute(
-            "UPDATE users SET cash = cash + $1, last_work = $2 WHERE id = $3",
-            earnings, now, interaction.user.id
-        )
+        # クールダウンはDB側でも確認 (連打されても二重に稼げない)
+        ready_before = now - datetime.timedelta(seconds=WORK_COOLDOWN)
+        if not await self.bot.bank.work(interaction.user.id, earnings, now, ready_before):
+            return await interaction.response.send_message("⏳ 休憩中... もう少し待ってね。", ephemeral=True)
+        cooldowns.trigger(interaction.user.id, "work", WORK_COOLDOWN, now.timestamp())
         
         await interaction.response.send_message(f"💼 **{job_id}** として働き、**{earnings:,}** 🪙 稼ぎました！")
 
     @s.command(name="slot", description="スロットを回します")
     async def slot(self, interaction: discord.Interaction, bet: int):
-        data = await self.get_user_data(interaction.user.id)
-        if data['cash'] < bet:
-            return await interaction.response.send_message("❌ 現金が足りません！", ephemeral=True)
-        
-        # 結果抽選
-        emojis = ["🍒", "🍋", "🍇", "🍉", "7️⃣"]
-        result = [random.choice(emojis) for _ in range(3)]
+        if bet <= 0: return await interaction.response.send_message("❌ 1以上を指定してください", ephemeral=True)
         
-        # 判定
-        win_amt = 0
-        if result[0] == result[1] == result[2]:
-            if result[0] == "7️⃣":
-                win_amt = bet * 10 # 大当たり
-            else:
-                win_amt = bet * 3
-        elif result[0] == result[1] or result[1] == result[2] or result[0] == result[2]:
-            win_amt = int(bet * 1.5)
+        # 結果抽選・判定 (倍率は utils/payout.py の SLOT で設定)
+        reels = [random.randrange(len(SLOT.symbols)) for _ in range(3)]
+        result = [SLOT.symbols[i] for i in reels]
+        win_amt = int(bet * slot_multiplier(SLOT, reels))
             
-        # DB更新
+        # DB更新 (残高チェックと増減を同時に行う)
+        delta = win_amt if win_amt > 0 else -bet
+        if not await self.bot.bank.charge(interaction.user.id, delta, bet, kind="slot"):
+            return await interaction.response.send_message("❌ 現金が足りません！", ephemeral=True)
         if win_amt > 0:
-            await self.bot.db.execute("UPDATE users SET cash = cash + $1 WHERE id = $2", win_amt, interaction.user.id)
             msg = f"🎉 **当たり！** {win_amt:,} 🪙 獲得！"
         else:
-            await self.bot.db.execute("UPDATE users SET cash = cash - $1 WHERE id = $2", bet, interaction.user.id)
             msg = "💀 **ハズレ...** ドンマイ。"
             
         embed = discord.Embed(title="🎰 スロットマシン", description=f"| {' | '.join(result)} |\n\n{msg}", color=0xE91E63)
@@ -113,58 +155,56 @@ class Economy(commands.Cog):
         if amount <= 0: return await interaction.response.send_message("❌ 1以上を指定してください", ephemeral=True)
         if user.id == interaction.user.id: return await interaction.response.send_message("❌ 自分には送れません", ephemeral=True)
         
-        sender = await self.get_user_data(interaction.user.id)
-        if sender['cash'] < amount:
+        # 残高チェック・引き落とし・入金を1ステートメントで実行
+        if not await self.bot.bank.transfer(interaction.user.id, user.id, amount):
             return await interaction.response.send_message("❌ 現金が足りません", ephemeral=True)
-            
-        # トランザクション
-        await self.bot.db.execute("UPDATE users SET cash = cash - $1 WHERE id = $2", amount, interaction.user.id)
-        await self.bot.db.execute("INSERT INTO users (id, cash) VALUES ($1, $2) ON CONFLICT (id) DO UPDATE SET cash = users.cash + $2", user.id, amount)
         
         await interaction.response.send_message(f"💸 {interaction.user.mention} が {user.mention} に **{amount:,}** 🪙 送金しました。")
 
     @s.command(name="borrow", description="借金をします (上限あり)")
     async def borrow(self, interaction: discord.Interaction, amount: int):
         if amount <= 0: return
-        data = await self.get_user_data(interaction.user.id)
-        
-        # 借金上限は総資産の50%までとする
-        net_worth = data['cash'] + data['bank']
-        max_borrow = max(10000, net_worth // 2) # 最低1万は借りれる
         
-        if data['debt'] + amount > max_borrow:
-            return await interaction.response.send_message(f"❌ 借金限度額オーバーです。(あと {max_borrow - data['debt']:,} 借りられます)", ephemeral=True)
+        # 借金上限は総資産の50%までとする (最低1万は借りれる。判定はDB側)
+        if not await self.bot.bank.borrow(interaction.user.id, amount):
+            data = await self.get_user_data(interaction.user.id)
+            max_borrow = max(10000, (data['cash'] + data['bank']) // 2)
+            return await interaction.response.send_message(f"❌ 借金限度額オーバーです。(あと {max(0, max_borrow - data['debt']):,} 借りられます)", ephemeral=True)
             
-        await self.bot.db.execute("UPDATE users SET cash = cash + $1, debt = debt + $1 WHERE id = $2", amount, interaction.user.id)
         await interaction.response.send_message(f"💳 **{amount:,}** 🪙 借りました。ご利用は計画的に。")
 
     @s.command(name="repay", description="借金を返済します")
     async def repay(self, interaction: discord.Interaction, amount: int):
         if amount <= 0: return
-        data = await self.get_user_data(interaction.user.id)
         
-        if data['debt'] <= 0:
-            return await interaction.response.send_message("✅ 借金はありません！", ephemeral=True)
-            
-        repay_amt = min(amount, data['debt'])
-        if data['cash'] < repay_amt:
+        result = await self.bot.bank.repay(interaction.user.id, amount)
+        if not result:
+            # 失敗理由の表示用にだけ読み直す
+            data = await self.get_user_data(interaction.user.id)
+            if data['debt'] <= 0:
+                return await interaction.response.send_message("✅ 借金はありません！", ephemeral=True)
             return await interaction.response.send_message("❌ 現金が足りません", ephemeral=True)
             
-        await self.bot.db.execute("UPDATE users SET cash = cash - $1, debt = debt - $1 WHERE id = $2", repay_amt, interaction.user.id)
-        await interaction.response.send_message(f"💳 **{repay_amt:,}** 🪙 返済しました。残り借金: {data['debt'] - repay_amt:,}")
+        data, repaid = result
+        await interaction.response.send_message(f"💳 **{repaid:,}** 🪙 返済しました。残り借金: {data['debt']:,}")
 
     @s.command(name="ranking", description="所持金ランキング")
-    async def ranking(self, interaction: discord.Interaction):
-        # サーバー内のユーザーのみ対象にしたいが、DB構造上全ユーザー取得になるため
-        # ここでは上位10名を表示
-        rows = await self.bot.db.fetch("SELECT id, cash, bank FROM users ORDER BY (cash + bank) DESC LIMIT 10")
+    @app_commands.describe(scope="集計範囲")
+    @app_commands.choices(scope=[
+        app_commands.Choice(name="全体", value="global"),
+        app_commands.Choice(name="このサーバー", value="server"),
+    ])
+    async def ranking(self, interaction: discord.Interaction, scope: str = "global"):
+        # 上位10名はメモリ上のランキングから返す (DBには候補が尽きたときだけ問い合わせる)
+        guild = interaction.guild if scope == "server" else None
+        rows = await self.bot.leaderboard.top(guild)
         
-        embed = discord.Embed(title="🏆 富豪ランキング", color=0xF1C40F)
+        title = f"🏆 {guild.name} 富豪ランキング" if guild else "🏆 富豪ランキング"
+        embed = discord.Embed(title=title, color=0xF1C40F)
         desc = ""
-        for i, row in enumerate(rows, 1):
-            user = self.bot.get_user(row['id'])
-            name = user.display_name if user else f"ID:{row['id']}"
-            total = row['cash'] + row['bank']
+        for i, (user_id, total) in enumerate(rows, 1):
+            user = (guild and guild.get_member(user_id)) or self.bot.get_user(user_id)
+            name = user.display_name if user else f"ID:{user_id}"
             desc += f"**{i}. {name}**: {total:,} 🪙\n"
             
         embed.description = desc
@@ -172,7 +212,29 @@ class Economy(commands.Cog):
         
     @s.command(name="info", description="経済システム情報")
     async def econ_info(self, interaction: discord.Interaction):
-         await interaction.response.send_message("📊 本日のスロットペイアウト率: 95% \n市場は安定しています。", ephemeral=True)
+        if not self.payout_reports:
+            return await interaction.response.send_message("📊 払い戻し率を集計中です。しばらくお待ちください。", ephemeral=True)
+        embed = discord.Embed(title="📊 ゲームの払い戻し率", color=0x3498DB)
+        for name, report in self.payout_reports.items():
+            embed.add_field(name=name, value=format_report(report), inline=False)
+        embed.set_footer(text=f"{next(iter(self.payout_reports.values()))['spins']:,} 回のシミュレーション結果")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="admin_ledger", description="【運営用】取引履歴から残高を再計算して照合")
+    async def admin_ledger(self, interaction: discord.Interaction, user: discord.User):
+        if interaction.user.id not in self.bot.admin_ids:
+            return await interaction.response.send_message("❌ 権限がありません", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True)
+        replayed = (await self.bot.ledger.replay(user.id)).get(user.id, [0, 0, 0])
+        data = await self.get_user_data(user.id)
+        actual = [data['cash'], data['bank'], data['debt']]
+
+        lines = []
+        for label, r, a in zip(("現金", "銀行", "借金"), replayed, actual):
+            mark = "✅" if r == a else "⚠️"
+            lines.append(f"{mark} {label}: 履歴 {r:,} / 実際 {a:,}")
+        await interaction.followup.send(f"🧾 **{user.display_name}** の照合結果\n" + "\n".join(lines), ephemeral=True)
 
     # --- 職業・ショップ関連 ---
     @app_commands.command(name="shop", description="職業を購入・変更")
@@ -196,11 +258,9 @@ class Economy(commands.Cog):
             job_name = select.values[0]
             cost = JOBS[job_name]['salary'] * 10
             
-            data = await self.get_user_data(it.user.id)
-            if data['cash'] < cost:
+            if not await self.bot.bank.buy_job(it.user.id, job_name, cost):
                 return await it.response.send_message("❌ お金が足りません！", ephemeral=True)
                 
-            await self.bot.db.execute("UPDATE users SET cash = cash - $1, job_id = $2 WHERE id = $3", cost, job_name, it.user.id)
             await it.response.send_message(f"🎉 転職成功！あなたは今日から **{job_name}** です！")
             
         select.callback = callback
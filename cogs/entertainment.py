@@ -1,83 +1,92 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import random
-from PIL import Image, ImageDraw, ImageFont, ImageOps
 import io
 import asyncio
+import logging
 import aiohttp
 from utils.constants import TOPICS, get_random_topic # パート1の定数を利用
+from utils.cache import LRUCache
+from utils.encode import EncodeStats
+from utils.omikuji import OmikujiTables, RecentMembers
+from utils.quote import render_quote, AVATAR_FETCH_SIZE
+from utils.render import RenderService, RenderBusy
+from utils.webhooks import WebhookCache
+
+AVATAR_CACHE_BYTES = 64 * 1024 * 1024
+AVATAR_FETCH_TIMEOUT = 10 # 秒 (CDNが応答しなくてもインタラクションを止めない)
 
 class Entertainment(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.renderer = RenderService()
+        self.encodes = EncodeStats()
+        self.http = None
+        # アバター画像 (key: アバターのハッシュ)。合計バイト数で上限をかける
+        self.avatars = LRUCache(maxsize=10_000, maxbytes=AVATAR_CACHE_BYTES)
+        self.webhooks = WebhookCache(bot.db, bot)
+        self.omikuji = OmikujiTables(bot.db)
+        self.recent = RecentMembers()
+
+    async def cog_load(self):
+        # ワーカーの起動 (spawn) は時間がかかるので先に立ち上げておく
+        self.renderer.start()
+        self.http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20),
+            timeout=aiohttp.ClientTimeout(total=AVATAR_FETCH_TIMEOUT),
+        )
+
+    async def cog_unload(self):
+        self.renderer.close()
+        await self.http.close()
+
+    def get_stats(self):
+        return {
+            "画像生成": self.renderer.stats(),
+            "画像エンコード": self.encodes.stats(),
+            "アバターキャッシュ": self.avatars.stats(),
+            "Webhookキャッシュ": self.webhooks.stats(),
+            "おみくじ": {**self.omikuji.stats(), **self.recent.stats()},
+        }
+
+    async def fetch_avatar(self, user):
+        """描画に使うサイズのアバターを取得 (同じハッシュなら通信しない)。失敗したら None"""
+        asset = user.display_avatar.replace(size=AVATAR_FETCH_SIZE, static_format="png")
+        data = self.avatars.get(asset.key)
+        if data is None:
+            async with self.http.get(asset.url) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.read()
+            self.avatars.set(asset.key, data)
+        return data
 
     # --- Make it Quote (日本語対応版) ---
     @app_commands.command(name="makeitquote", description="名言風画像を生成します")
     async def makeitquote(self, interaction: discord.Interaction, user: discord.Member, text: str):
         await interaction.response.defer()
 
-        # 設定
-        WIDTH, HEIGHT = 1200, 400
-        BG_COLOR = (20, 20, 20) # Discord Darker
-        
-        # 画像生成
-        img = Image.new('RGB', (WIDTH, HEIGHT), color=BG_COLOR)
-        draw = ImageDraw.Draw(img)
-        
-        # フォント読み込み (fontsフォルダから。なければデフォルト)
+        # アバター取得
         try:
-            font_path = "fonts/NotoSansJP-Bold.ttf"
-            font = ImageFont.truetype(font_path, 50)
-            name_font = ImageFont.truetype(font_path, 40)
-            logo_font = ImageFont.truetype(font_path, 20)
-        except OSError:
-            # フォールバック
-            font = ImageFont.load_default()
-            name_font = ImageFont.load_default()
-            logo_font = ImageFont.load_default()
+            data = await self.fetch_avatar(user)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"⚠️ アバターの取得に失敗しました: {e}")
+            data = None
+        if data is None:
+            return await interaction.followup.send("❌ アバターの取得に失敗しました")
 
-        # アバター取得
-        avatar_url = user.display_avatar.url
+        # 描画はプロセスプールで行う (イベントループを止めない)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(avatar_url) as resp:
-                    if resp.status != 200:
-                        return await interaction.followup.send("❌ アバターの取得に失敗しました")
-                    data = await resp.read()
-                    
-            avatar_img = Image.open(io.BytesIO(data)).convert("RGBA")
-            avatar_img = avatar_img.resize((300, 300))
-            
-            # 丸く切り抜く
-            mask = Image.new("L", (300, 300), 0)
-            draw_mask = ImageDraw.Draw(mask)
-            draw_mask.ellipse((0, 0, 300, 300), fill=255)
-            
-            # 貼り付け
-            img.paste(avatar_img, (50, 50), mask)
+            image = await self.renderer.render(render_quote, data, text, user.display_name)
+        except RenderBusy:
+            return await interaction.followup.send("⏳ 画像生成が混み合っています。少し待ってからもう一度お試しください。")
         except Exception as e:
-            print(f"Image Error: {e}")
+            logging.error(f"❌ Image Error: {e}")
             return await interaction.followup.send("❌ 画像処理エラーが発生しました")
 
-        # テキスト描画 (簡易折り返し)
-        max_chars_per_line = 25
-        wrapped_text = ""
-        for i in range(0, len(text), max_chars_per_line):
-            wrapped_text += text[i:i+max_chars_per_line] + "\n"
-            
-        # テキスト位置
-        draw.text((380, 100), wrapped_text, font=font, fill=(255, 255, 255))
-        draw.text((380, 50), f"- {user.display_name}", font=name_font, fill=(150, 150, 150))
-        
-        # ロゴ (右下)
-        draw.text((WIDTH - 150, HEIGHT - 40), "Rumia Bot", font=logo_font, fill=(100, 100, 100))
-
-        # 送信
-        with io.BytesIO() as image_binary:
-            img.save(image_binary, 'PNG')
-            image_binary.seek(0)
-            await interaction.followup.send(file=discord.File(fp=image_binary, filename='quote.png'))
+        # 送信 (一番小さくなった形式で)
+        self.encodes.record(image)
+        await interaction.followup.send(file=discord.File(fp=io.BytesIO(image.data), filename=f'quote.{image.ext}'))
 
     # --- なりすまし (Fake) ---
     @app_commands.command(name="fake", description="指定したユーザーになりすまして発言(Webhook)")
@@ -87,76 +96,76 @@ class Entertainment(commands.Cog):
         clean_content = discord.utils.remove_markdown(message)
         clean_content = clean_content.replace("@", "@\u200b") # Zero width space
         
-        # Webhook取得または作成
-        webhook = None
+        # Webhook取得または作成 (キャッシュ済みなら送信1回だけ)
         try:
-            webhooks = await interaction.channel.webhooks()
-            for w in webhooks:
-                if w.name == "RumiaFake":
-                    webhook = w
+            for retry in (True, False):
+                webhook = await self.webhooks.get(interaction.channel)
+                try:
+                    await webhook.send(
+                        content=clean_content,
+                        username=target.display_name,
+                        avatar_url=target.display_avatar.url,
+                        allowed_mentions=discord.AllowedMentions.none()
+                    )
                     break
-            
-            if not webhook:
-                webhook = await interaction.channel.create_webhook(name="RumiaFake")
-                
-            await webhook.send(
-                content=clean_content,
-                username=target.display_name,
-                avatar_url=target.display_avatar.url,
-                allowed_mentions=discord.AllowedMentions.none()
-            )
+                except discord.NotFound:
+                    # Webhookが消されていた: 捨てて1回だけ取り直す
+                    await self.webhooks.invalidate(interaction.channel.id)
+                    if not retry:
+                        raise
             await interaction.response.send_message("🥷", ephemeral=True)
-            
+
         except discord.Forbidden:
             await interaction.response.send_message("❌ Webhookを作成する権限がありません。", ephemeral=True)
 
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel):
+        await self.webhooks.on_webhooks_update(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        await self.webhooks.invalidate(channel.id)
+
+    # ラッキーパーソン候補 (最近発言した人) を集める
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.guild and not message.author.bot:
+            self.recent.touch(message.guild.id, message.author.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.recent.remove(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.recent.remove_guild(guild.id)
+        self.omikuji.invalidate(guild.id)
+
     # --- おみくじ (設定機能付き) ---
     omikuji_group = app_commands.Group(name="omikuji", description="おみくじ関連")
 
     @omikuji_group.command(name="play", description="運勢を占います")
     async def play_omikuji(self, interaction: discord.Interaction):
-        # DBからカスタム設定を取得、なければデフォルト
-        custom = await self.bot.db.fetch("SELECT * FROM omikuji_settings WHERE guild_id = $1", interaction.guild_id)
-        
-        if custom:
-            # 確率に基づいて抽選 (重み付け抽選)
-            choices = []
-            weights = []
-            for row in custom:
-                choices.append(row)
-                weights.append(row['probability'])
-            
-            if not choices:
-                result = {"result_name": "吉", "description": "普通が一番"}
-            else:
-                result = random.choices(choices, weights=weights, k=1)[0]
-                
-            title = result['result_name']
-            desc = result['description']
-        else:
-            results = [
-                ("大吉", "最高の1日になるでしょう！"),
-                ("中吉", "いいことあるかも。"),
-                ("吉", "普通が一番。"),
-                ("凶", "足元に気をつけて。"),
-                ("大凶", "家にいよう。")
-            ]
-            title, desc = random.choice(results)
-        
-        # 「今日話しかけるべき人」
-        member = random.choice(interaction.guild.members)
-        
+        # ギルドの抽選表 (カスタム設定が無ければデフォルト) から重み付きで抽選
+        table = await self.omikuji.get(interaction.guild_id)
+        title, desc = table.draw()
+
+        # 「今日話しかけるべき人」は最近発言した人から選ぶ (いなければ本人)
+        user_id = self.recent.pick(interaction.guild_id) or interaction.user.id
+
         embed = discord.Embed(title=f"⛩️ おみくじ結果: **{title}**", description=desc, color=0xE91E63)
-        embed.add_field(name="ラッキーパーソン", value=f"{member.mention} に話しかけてみよう！")
+        embed.add_field(name="ラッキーパーソン", value=f"<@{user_id}> に話しかけてみよう！")
         await interaction.response.send_message(embed=embed)
 
     @omikuji_group.command(name="add", description="おみくじの結果を追加")
     @app_commands.checks.has_permissions(administrator=True)
     async def add_omikuji(self, interaction: discord.Interaction, name: str, description: str, probability: int):
         await self.bot.db.execute(
-            "INSERT INTO omikuji_settings (guild_id, result_name, description, probability) VALUES ($1, $2, $3, $4)",
+            "omikuji.add",
             interaction.guild.id, name, description, probability
         )
+        # 次回の抽選で表を作り直す
+        self.omikuji.invalidate(interaction.guild.id)
         await interaction.response.send_message(f"✅ 追加しました: {name} (重み: {probability})")
 
     # --- 話題提供 ---
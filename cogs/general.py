@@ -85,6 +85,44 @@ class General(commands.Cog):
         embed = discord.Embed(title="🏢 参加サーバー Top 30", description=desc, color=0x9B59B6)
         await interaction.followup.send(embed=embed)
 
+    @app_commands.command(name="admin_stats", description="【運営用】キャッシュ等の内部統計")
+    async def admin_stats(self, interaction: discord.Interaction):
+        if interaction.user.id not in self.bot.admin_ids:
+            return await interaction.response.send_message("❌ 権限がありません", ephemeral=True)
+
+        # データベースと get_stats() を持つCogから統計を集める
+        stats = {"データベース": self.bot.db.get_stats()}
+        for cog in self.bot.cogs.values():
+            if hasattr(cog, "get_stats"):
+                stats.update(cog.get_stats())
+
+        embed = discord.Embed(title="📈 内部統計", color=0x9B59B6)
+        for name, values in list(stats.items())[:25]: # フィールドは25個制限
+            value = "\n".join(f"｜{k}: {v}" for k, v in values.items())
+            embed.add_field(name=f"｜{name}", value=value[:1024] or "-", inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="admin_queries", description="【運営用】遅いクエリTop10")
+    @app_commands.choices(order=[
+        app_commands.Choice(name="平均時間", value="avg"),
+        app_commands.Choice(name="最大時間", value="max"),
+        app_commands.Choice(name="合計時間", value="total"),
+    ])
+    async def admin_queries(self, interaction: discord.Interaction, order: str = "avg"):
+        if interaction.user.id not in self.bot.admin_ids:
+            return await interaction.response.send_message("❌ 権限がありません", ephemeral=True)
+
+        desc = ""
+        for i, (name, s) in enumerate(self.bot.db.slowest(10, order), 1):
+            desc += (
+                f"**{i}. `{name}`**\n"
+                f"｜{s.calls}回 | 平均 {s.avg * 1000:.1f}ms | 最大 {s.max * 1000:.1f}ms | "
+                f"行数 {s.rows} | プール待ち {s.pool_wait / s.calls * 1000:.1f}ms\n"
+                f"｜p50 ≤{s.percentile(0.5):.0f}ms | p95 ≤{s.percentile(0.95):.0f}ms | p99 ≤{s.percentile(0.99):.0f}ms\n"
+            )
+        embed = discord.Embed(title="🐢 遅いクエリ", description=desc[:4096] or "まだ記録がありません", color=0x9B59B6)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     # --- 便利機能 ---
     @app_commands.command(name="avatar", description="ユーザーのアイコンを表示")
     async def avatar(self, interaction: discord.Interaction, user: discord.User = None):
@@ -2,8 +2,15 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import datetime
-import re
 import asyncio
+from utils.cache import LRUCache
+from utils.matcher import TriggerMatcher
+from utils.automod import compile_rules
+from utils.flood import FloodDetector
+from utils.actions import ModerationQueue
+
+# 自動応答キャッシュに保持するギルド数の上限 (超えたらアイドルなギルドから追い出す)
+AUTO_RESPONSE_CACHE_SIZE = 1000
 
 # --- 認証ボタンのView ---
 class VerifyView(discord.ui.View):
@@ -32,9 +39,81 @@ class VerifyView(discord.ui.View):
         else:
             await interaction.followup.send("⚠️ 既に認証済みか、ロールが見つかりません。", ephemeral=True)
 
+# --- 自動応答セット (ギルド単位でトリガーをまとめてコンパイル) ---
+class AutoResponseSet:
+    __slots__ = ("rows", "matcher")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.matcher = TriggerMatcher([row['trigger'] for row in rows])
+
+    def find(self, content):
+        """最初にヒットした自動応答の行を返す (なければNone)"""
+        index = self.matcher.match(content)
+        return None if index is None else self.rows[index]
+
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # ギルドID -> AutoResponseSet (初回メッセージ時に遅延ロード)
+        self.ar_cache = LRUCache(maxsize=AUTO_RESPONSE_CACHE_SIZE)
+        self._ar_loading = {} # ギルドID -> 読み込み中のTask (同時の初回メッセージは1回の読み込みにまとめる)
+        self._ar_stale = set() # 読み込み中に追加・削除があったギルド (その読み込み結果はキャッシュしない)
+        # 短時間の連投検知 (AutoModレベル2以上のギルドで有効)
+        self.flood = FloodDetector()
+        # 処罰はキュー経由でまとめて実行する
+        self.actions = ModerationQueue()
+
+    async def cog_load(self):
+        self.actions.start()
+
+    async def cog_unload(self):
+        await self.actions.stop()
+
+    async def _load_auto_responses(self, guild_id):
+        try:
+            rows = await self.bot.db.fetch("auto_responses.by_guild", guild_id)
+            responses = AutoResponseSet(list(rows))
+            if guild_id in self._ar_stale:
+                # 読み込み中に変更された: 古いかもしれないので今回だけ使い、次のメッセージで読み直す
+                self._ar_stale.discard(guild_id)
+            else:
+                self.ar_cache.set(guild_id, responses)
+            return responses
+        finally:
+            self._ar_loading.pop(guild_id, None)
+
+    async def get_auto_responses(self, guild_id):
+        """自動応答をキャッシュから取得 (未ロードならDBから読み込む)"""
+        responses = self.ar_cache.get(guild_id)
+        if responses is None:
+            task = self._ar_loading.get(guild_id)
+            if task is None:
+                task = self._ar_loading[guild_id] = asyncio.create_task(self._load_auto_responses(guild_id))
+            responses = await task
+        return responses
+
+    def _invalidate_loading(self, guild_id):
+        if guild_id in self._ar_loading:
+            self._ar_stale.add(guild_id)
+
+    async def get_automod_rules(self, guild_id):
+        """ギルド設定からAutoModルールを取得 (設定はbot.settingsでキャッシュ、ルールはレベルごとにコンパイル済み)"""
+        settings = await self.bot.settings.get_guild(guild_id)
+        if not settings.exists:
+            # 未設定のギルドは従来通り重複文字チェックのみ
+            return compile_rules(1)
+        if settings.automod_enabled:
+            return compile_rules(settings.automod_level or 1)
+        return None
+
+    def get_stats(self):
+        return {
+            "自動応答キャッシュ": self.ar_cache.stats(),
+            "ギルド設定キャッシュ": self.bot.settings.stats(),
+            "連投検知": self.flood.stats(),
+            "処罰キュー": self.actions.stats(),
+        }
 
     # --- メッセージ監視 (AutoMod & AutoReply) ---
     @commands.Cog.listener()
@@ -43,43 +122,36 @@ class Moderation(commands.Cog):
         if not message.guild: return
 
         # 1. 自動応答 (Auto Response)
-        # DBから取得 (キャッシュ推奨だが要件に従い実装)
-        responses = await self.bot.db.fetch("SELECT * FROM auto_responses WHERE guild_id = $1", message.guild.id)
-        for row in responses:
-            if row['trigger'] in message.content:
-                if row['response']:
-                    await message.channel.send(row['response'])
-                if row['reaction']:
-                    try:
-                        await message.add_reaction(row['reaction'])
-                    except:
-                        pass
-                break # 1つヒットしたら終了
-
-        # 2. スパム検知 (重複文字)
-        # 「同じ文字が10回以上続き、かつ5回以上連続投稿」は判定が難しいので
-        # 「1つのメッセージ内で同じ文字が10連続以上している」または「短時間の連投」を検知
-        
+        # キャッシュから取得 (定常状態ではDBに問い合わせない)
+        responses = await self.get_auto_responses(message.guild.id)
+        # 全トリガーを1パスで照合し、最初にヒットしたものだけ応答する
+        row = responses.find(message.content)
+        if row:
+            if row['response']:
+                await message.channel.send(row['response'])
+            if row['reaction']:
+                try:
+                    await message.add_reaction(row['reaction'])
+                except:
+                    pass
+
+        # 2. AutoMod (ギルドの設定レベルに応じたルールを1パスで判定)
         # 除外判定 (管理者権限持ちはスルー)
         if message.author.guild_permissions.administrator:
             return
 
-        # 重複文字検知 (例: "ああああああああああ")
-        if re.search(r'(.)\1{9,}', message.content):
-            # ホワイトリスト確認
-            is_allow = await self.bot.db.fetchval("SELECT 1 FROM admin_whitelist WHERE user_id = $1", message.author.id)
-            if not is_allow:
-                try:
-                    await message.delete()
-                    duration = datetime.timedelta(minutes=10) # デフォルト10分
-                    await message.author.timeout(duration, reason="AutoMod: 重複文字スパム")
-                    msg = await message.channel.send(f"🔒 {message.author.mention} をスパム検知で10分間タイムアウトしました。")
-                    await asyncio.sleep(10)
-                    await msg.delete()
-                except discord.Forbidden:
-                    pass
-                except Exception as e:
-                    print(f"AutoMod Error: {e}")
+        rules = await self.get_automod_rules(message.guild.id)
+        reason = None
+        if rules:
+            reason = rules.check(message.content)
+            if rules.flood:
+                # 履歴を残すため他のルールで違反していても記録はする
+                reason = self.flood.check(message.guild.id, message.author.id, message.content) or reason
+        if reason:
+            # ホワイトリスト確認 (メモリ上のセットを参照)
+            if not self.bot.settings.is_whitelisted(message.author.id):
+                # 削除・タイムアウト(10分)・通知はキューでまとめて処理
+                self.actions.submit(message, reason)
 
     # --- 処罰コマンド ---
     @app_commands.command(name="timeout", description="ユーザーをタイムアウト(ミュート)します")
@@ -132,21 +204,37 @@ class Moderation(commands.Cog):
         await interaction.channel.send(embed=embed, view=view)
         await interaction.response.send_message("✅ パネルを設置しました", ephemeral=True)
 
+    # --- AutoMod設定 ---
+    @app_commands.command(name="automod", description="AutoModの有効化とレベル設定 (1:重複文字 2:+招待リンク/Zalgo/連投 3:+メンション/大文字)")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def automod_setup(self, interaction: discord.Interaction, enabled: bool, level: int = 1):
+        if not 1 <= level <= 3:
+            return await interaction.response.send_message("❌ レベルは1〜3で指定してください", ephemeral=True)
+
+        await self.bot.settings.update_guild(interaction.guild.id, automod_enabled=enabled, automod_level=level)
+        status = f"有効 (レベル{level})" if enabled else "無効"
+        await interaction.response.send_message(f"🛡️ AutoModを{status}にしました。")
+
     # --- 自動応答管理 ---
     auto = app_commands.Group(name="auto_response", description="自動応答の設定")
 
     @auto.command(name="add", description="自動応答を追加")
     @app_commands.checks.has_permissions(administrator=True)
     async def ar_add(self, interaction: discord.Interaction, trigger: str, response: str, reaction: str = None):
-        await self.bot.db.execute(
-            "INSERT INTO auto_responses (guild_id, trigger, response, reaction) VALUES ($1, $2, $3, $4)",
+        row = await self.bot.db.fetchrow(
+            "auto_responses.add",
             interaction.guild.id, trigger, response, reaction
         )
+        # ロード済みならそのギルドのセットだけ作り直す (未ロードなら次回メッセージ時に読み込まれる)
+        self._invalidate_loading(interaction.guild.id)
+        cached = self.ar_cache.get(interaction.guild.id)
+        if cached is not None and row:
+            self.ar_cache.set(interaction.guild.id, AutoResponseSet(cached.rows + [row]))
         await interaction.response.send_message(f"✅ 追加しました: 「{trigger}」→「{response}」")
 
     @auto.command(name="list", description="自動応答の一覧")
     async def ar_list(self, interaction: discord.Interaction):
-        rows = await self.bot.db.fetch("SELECT id, trigger, response FROM auto_responses WHERE guild_id = $1", interaction.guild.id)
+        rows = await self.bot.db.fetch("auto_responses.list", interaction.guild.id)
         if not rows:
             return await interaction.response.send_message("❌ 設定されていません", ephemeral=True)
         
@@ -158,7 +246,11 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     async def ar_delete(self, interaction: discord.Interaction, id: int):
         # 本来はSelectMenuで選ばせるが、実装簡略化のためID指定
-        await self.bot.db.execute("DELETE FROM auto_responses WHERE id = $1 AND guild_id = $2", id, interaction.guild.id)
+        await self.bot.db.execute("auto_responses.delete", id, interaction.guild.id)
+        self._invalidate_loading(interaction.guild.id)
+        cached = self.ar_cache.get(interaction.guild.id)
+        if cached is not None:
+            self.ar_cache.set(interaction.guild.id, AutoResponseSet([row for row in cached.rows if row['id'] != id]))
         await interaction.response.send_message(f"🗑️ ID:{id} を削除しました。")
 
     # --- ホワイトリスト ---
@@ -167,7 +259,7 @@ class Moderation(commands.Cog):
         if interaction.user.id not in self.bot.admin_ids:
             return await interaction.response.send_message("❌ 権限がありません", ephemeral=True)
             
-        await self.bot.db.execute("INSERT INTO admin_whitelist (user_id) VALUES ($1) ON CONFLICT DO NOTHING", user.id)
+        await self.bot.settings.add_whitelist(user.id)
         await interaction.response.send_message(f"✅ {user.name} をホワイトリストに追加しました。")
 
 async def setup(bot):
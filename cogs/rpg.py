@@ -3,10 +3,30 @@ from discord import app_commands
 from discord.ext import commands
 import random
 import asyncio
+import datetime
+from utils.payout import EMERALD
+from utils.nation import accrue
+from utils.nation_events import EVENT_NAMES, run_event
+from utils.shiritori import WordStore, ShiritoriSession, normalize
+
+COLLECT_COOLDOWN = 86400 # 1日
+SHIRITORI_TIMEOUT = 30   # 秒
 
 class RPG(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.words = WordStore()
+        self.sessions = {} # (channel_id, user_id) -> ShiritoriSession
+
+    def cog_unload(self):
+        for session in self.sessions.values():
+            session.timer.cancel()
+        self.sessions.clear()
+
+    def get_stats(self):
+        stats = self.words.stats()
+        stats["sessions"] = len(self.sessions)
+        return {"しりとり": stats}
 
     # --- ゲームコマンド群 ---
     game = app_commands.Group(name="game", description="ミニゲーム集")
@@ -15,19 +35,15 @@ class RPG(commands.Cog):
     async def emerald(self, interaction: discord.Interaction, bet: int):
         # 簡易的な賭けゲーム
         if bet <= 0: return
-        # ユーザー資産チェックはEconomy Cogのメソッドを使うか、ここでDB直叩き
-        # 簡略化のためDB直叩き
-        current = await self.bot.db.fetchval("SELECT cash FROM users WHERE id = $1", interaction.user.id) or 0
-        if current < bet:
+        # 勝率・倍率は utils/payout.py の EMERALD で設定 (残高チェックと増減は bot.bank で同時に行う)
+        win = random.random() < EMERALD.win_prob
+        gain = int(bet * EMERALD.win_mult)
+        if not await self.bot.bank.charge(interaction.user.id, gain if win else -bet, bet, kind="emerald"):
             return await interaction.response.send_message("❌ 資金不足です。", ephemeral=True)
             
-        # 勝率50%
-        win = random.choice([True, False])
         if win:
-            await self.bot.db.execute("UPDATE users SET cash = cash + $1 WHERE id = $2", bet, interaction.user.id)
-            await interaction.response.send_message(f"💎 **勝利！** エメラルドが輝き、{bet} 獲得！")
+            await interaction.response.send_message(f"💎 **勝利！** エメラルドが輝き、{gain} 獲得！")
         else:
-            await self.bot.db.execute("UPDATE users SET cash = cash - $1 WHERE id = $2", bet, interaction.user.id)
             await interaction.response.send_message(f"💔 **敗北...** エメラルドは砕け散った... (-{bet})")
 
     @game.command(name="8ball", description="魔法の水晶で占う")
@@ -49,21 +65,59 @@ class RPG(commands.Cog):
 
     @game.command(name="shiritori", description="Botとしりとり")
     async def shiritori(self, interaction: discord.Interaction):
-        # 簡易しりとりロジック
-        await interaction.response.send_message("🍎 しりとり開始！「りんご」！ (次の言葉を入力してね)")
-        
-        def check(m):
-            return m.author == interaction.user and m.channel == interaction.channel
-            
-        try:
-            msg = await self.bot.wait_for('message', timeout=30.0, check=check)
-            content = msg.content
-            if content.startswith("ご"):
-                await interaction.followup.send("🦍 ゴリラ！...あ、また「ら」だ！\n私の負けです...降参！")
-            else:
-                await interaction.followup.send(f"🤔 {content}...? うーん、難しい言葉知ってるね！今回は引き分け！")
-        except asyncio.TimeoutError:
-            await interaction.followup.send("⏰ 時間切れ！私の勝ち！")
+        key = (interaction.channel_id, interaction.user.id)
+        if key in self.sessions:
+            return await interaction.response.send_message("❌ このチャンネルで対戦中です", ephemeral=True)
+
+        # 対戦は on_message で (チャンネル, ユーザー) から引く (wait_for を積み重ねない)
+        first = self.words.random_word()
+        session = self.sessions[key] = ShiritoriSession(interaction.channel, interaction.user.id, first)
+        self._reset_timer(key, session)
+        await interaction.response.send_message(
+            f"🍎 しりとり開始！「**{first}**」！ 「{session.next}」から始まる言葉をひらがなかカタカナで入力してね ({SHIRITORI_TIMEOUT}秒以内)"
+        )
+
+    def _reset_timer(self, key, session):
+        if session.timer:
+            session.timer.cancel()
+        session.timer = asyncio.get_running_loop().call_later(SHIRITORI_TIMEOUT, self._timeout, key)
+
+    def _timeout(self, key):
+        session = self.sessions.pop(key, None)
+        if session:
+            asyncio.create_task(session.channel.send(f"⏰ <@{session.user_id}> 時間切れ！私の勝ち！ ({session.turns}ターン)"))
+
+    def _end(self, key):
+        session = self.sessions.pop(key)
+        session.timer.cancel()
+        return session
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if not self.sessions or message.author.bot:
+            return
+        key = (message.channel.id, message.author.id)
+        session = self.sessions.get(key)
+        if session is None:
+            return
+        word = normalize(message.content)
+        if word is None:
+            return # かな以外のメッセージは会話として無視
+
+        error = session.check(word)
+        if error:
+            reason, lost = error
+            if not lost:
+                return await message.reply(f"🤔 {reason}")
+            self._end(key)
+            return await message.reply(f"💀 {reason}！私の勝ち！ ({session.turns}ターン)")
+
+        reply = session.play(self.words, word)
+        if reply is None:
+            self._end(key)
+            return await message.reply(f"🏳️ 「{word}」... 思いつかない！私の負けです！ ({session.turns}ターン)")
+        self._reset_timer(key, session)
+        await message.reply(f"💬 「**{reply}**」！ 次は「{session.next}」だよ")
 
     @game.command(name="bot-quest", description="Botからのクエスト")
     async def quest(self, interaction: discord.Interaction):
@@ -83,44 +137,73 @@ class RPG(commands.Cog):
 
     @nation.command(name="create", description="国家を建国する")
     async def create_nation(self, interaction: discord.Interaction, name: str):
-        exists = await self.bot.db.fetchval("SELECT 1 FROM nations WHERE user_id = $1", interaction.user.id)
+        exists = await self.bot.db.fetchval("nations.exists", interaction.user.id)
         if exists:
             return await interaction.response.send_message("❌ すでに国家を持っています。", ephemeral=True)
             
         await self.bot.db.execute(
-            "INSERT INTO nations (user_id, name) VALUES ($1, $2)",
-            interaction.user.id, name
+            "nations.create",
+            interaction.user.id, name, datetime.datetime.now()
         )
         await interaction.response.send_message(f"🚩 **{name}** 建国！\n人口: 100人 | 資源: 1000 | 軍備: 0")
 
     @nation.command(name="status", description="国家のステータス")
     async def nation_status(self, interaction: discord.Interaction):
-        data = await self.bot.db.fetchrow("SELECT * FROM nations WHERE user_id = $1", interaction.user.id)
+        data = await self.bot.db.fetchrow("nations.get", interaction.user.id)
         if not data:
             return await interaction.response.send_message("❌ 国家を持っていません。`/nation create` で建国してください。", ephemeral=True)
             
+        # 前回の更新からの経過分を計算して表示するだけ (DBには書き込まない)
+        state = accrue(data, datetime.datetime.now())
         embed = discord.Embed(title=f"🚩 {data['name']} の状況", color=0xE74C3C)
-        embed.add_field(name="👥 人口", value=f"{data['population']:,} 人", inline=True)
-        embed.add_field(name="🪵 資源", value=f"{data['resources']:,}", inline=True)
+        embed.add_field(name="👥 人口", value=f"{state['population']:,} 人 (+{state['growth']:.1%}/日)", inline=True)
+        embed.add_field(name="🪵 資源", value=f"{state['resources']:,}", inline=True)
         embed.add_field(name="⚔️ 軍備", value=f"{data['army']:,}", inline=True)
         embed.add_field(name="💰 税率", value=f"{data['tax_rate']}%", inline=True)
+        embed.add_field(name="🏦 未徴収の税収", value=f"{state['treasury']:,} 🪙", inline=True)
         
         await interaction.response.send_message(embed=embed)
 
     @nation.command(name="collect", description="税金と資源を徴収 (1日1回)")
     async def collect(self, interaction: discord.Interaction):
-        data = await self.bot.db.fetchrow("SELECT * FROM nations WHERE user_id = $1", interaction.user.id)
+        uid = interaction.user.id
+        cooldowns = self.bot.cooldowns
+        remaining = cooldowns.remaining(uid, "collect")
+        if remaining:
+            return await interaction.response.send_message(f"⏳ 次の徴収まであと {int(remaining)//3600}時間{int(remaining)%3600//60}分です", ephemeral=True)
+
+        # 行をロックして経過分を計算し、書き戻すまでを1トランザクションで行う
+        now = datetime.datetime.now()
+        state = None
+        async with self.bot.db.transaction() as tx:
+            data = await tx.fetchrow("nations.get_for_update", uid)
+            # クールダウン中 (再起動直後など) ならDBの last_collect から登録
+            if data and not cooldowns.seed(uid, "collect", data['last_collect'], COLLECT_COOLDOWN, now.timestamp()):
+                state = accrue(data, now)
+                await tx.execute("nations.collect", uid, state['population'], state['resources'], now)
         if not data: return await interaction.response.send_message("❌ 建国してください", ephemeral=True)
+        if state is None:
+            remaining = cooldowns.remaining(uid, "collect")
+            return await interaction.response.send_message(f"⏳ 次の徴収まであと {int(remaining)//3600}時間{int(remaining)%3600//60}分です", ephemeral=True)
+        cooldowns.trigger(uid, "collect", COLLECT_COOLDOWN, now.timestamp())
         
-        # 簡易計算
-        money_gain = data['population'] * (data['tax_rate'] / 100) * 10
-        resource_gain = data['population'] * 2
-        
-        # Userテーブルにお金追加、Nationテーブルに資源追加
-        await self.bot.db.execute("UPDATE users SET cash = cash + $1 WHERE id = $2", int(money_gain), interaction.user.id)
-        await self.bot.db.execute("UPDATE nations SET resources = resources + $1 WHERE user_id = $2", int(resource_gain), interaction.user.id)
+        # 貯まった税収をUserテーブルに入金 (資源は上で国家に反映済み)
+        money_gain, resource_gain = state['treasury'], state['resources'] - data['resources']
+        await self.bot.bank.credit(uid, money_gain, kind="nation_collect")
         
-        await interaction.response.send_message(f"📦 徴収完了！\n資金: +{int(money_gain)} | 資源: +{int(resource_gain)}")
+        await interaction.response.send_message(f"📦 徴収完了！\n資金: +{money_gain} | 資源: +{resource_gain}")
+
+    @app_commands.command(name="admin_nation_event", description="【運営用】全国家にイベントを発生させる")
+    @app_commands.choices(kind=[app_commands.Choice(name=name, value=key) for key, name in EVENT_NAMES.items()])
+    async def nation_event(self, interaction: discord.Interaction, kind: str):
+        if interaction.user.id not in self.bot.admin_ids:
+            return await interaction.response.send_message("❌ 権限がありません", ephemeral=True)
+
+        await interaction.response.defer()
+        summary, count, elapsed = await run_event(self.bot.db, kind)
+        embed = discord.Embed(title=f"{EVENT_NAMES[kind]} が発生しました！", description=summary, color=0xE67E22)
+        embed.set_footer(text=f"{count:,}か国を処理 ({elapsed * 1000:.0f}ms)")
+        await interaction.followup.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(RPG(bot))
@@ -7,6 +7,12 @@ import requests
 import base64
 from aiohttp import web
 from utils.database import Database
+from utils.settings import SettingsStore
+from utils.bank import Bank
+from utils.leaderboard import Leaderboard
+from utils.cooldown import Cooldowns
+from utils.maintenance import Maintenance
+from utils.ledger import Ledger
 
 # ログ設定 (詳細な情報を見やすく出力)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
@@ -23,9 +29,22 @@ class RumiaBot(commands.Bot):
             case_insensitive=True
         )
         self.db = Database()
+        self.settings = SettingsStore(self.db)
+        # 経済の取引履歴 (まとめて書き込む)
+        self.ledger = Ledger(self.db)
+        # ECONOMY_WRITE_BEHIND=1 で入金をメモリに貯めてまとめて書き込む
+        self.bank = Bank(self.db, self.ledger, write_behind=os.getenv("ECONOMY_WRITE_BEHIND") == "1")
+        # 総資産ランキング (残高の変化は Bank から通知される)
+        self.leaderboard = Leaderboard(self.db)
+        self.bank.listeners.append(self.leaderboard.on_balance)
+        # /s work・/nation collect などのクールダウン (連打はDBに触れずに弾く)
+        self.cooldowns = Cooldowns()
+        # 利息などの経済の定期処理
+        self.maintenance = Maintenance(self.db, self.bank, self.leaderboard, self.ledger)
         # 環境変数 ADMIN_IDS から管理者IDリストを作成
         admin_env = os.getenv("ADMIN_IDS", "")
         self.admin_ids = [int(id) for id in admin_env.split(",") if id.isdigit()]
+        self.tree.error(self.on_app_command_error)
 
     async def setup_hook(self):
         """Bot起動時の初期化処理"""
@@ -38,6 +57,10 @@ class RumiaBot(commands.Bot):
         
         # 2. データベース接続
         await self.db.connect()
+        await self.settings.load()
+        self.ledger.start()
+        self.bank.start()
+        self.maintenance.start()
         
         # 3. Cog (機能拡張) のロード
         await self.load_extensions()
@@ -112,29 +135,35 @@ class RumiaBot(commands.Bot):
         await self.change_presence(activity=discord.Game(name="/help | Rumia Bot"))
 
     async def close(self):
+        # 未反映の残高を書き込んでからDBを閉じる
+        await self.maintenance.close()
+        await self.bank.close()
+        await self.ledger.close()
         await self.db.close()
         await super().close()
 
-bot = RumiaBot()
-
-# --- グローバルエラーハンドリング ---
-@bot.tree.error
-async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
-    if isinstance(error, discord.app_commands.CommandOnCooldown):
-        await interaction.response.send_message(f"⏳ クールダウン中です。あと {error.retry_after:.2f} 秒お待ちください。", ephemeral=True)
-    elif isinstance(error, discord.app_commands.MissingPermissions):
-        await interaction.response.send_message("❌ 権限が不足しています。", ephemeral=True)
-    else:
-        logging.error(f"Command Error: {error}")
-        # インタラクションが既に終了しているか確認して送信
-        if interaction.response.is_done():
-            await interaction.followup.send(f"❌ エラーが発生しました: {error}", ephemeral=True)
+    # --- グローバルエラーハンドリング ---
+    async def on_app_command_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+        if isinstance(error, discord.app_commands.CommandOnCooldown):
+            await interaction.response.send_message(f"⏳ クールダウン中です。あと {error.retry_after:.2f} 秒お待ちください。", ephemeral=True)
+        elif isinstance(error, discord.app_commands.MissingPermissions):
+            await interaction.response.send_message("❌ 権限が不足しています。", ephemeral=True)
         else:
-            await interaction.response.send_message(f"❌ エラーが発生しました: {error}", ephemeral=True)
+            logging.error(f"Command Error: {error}")
+            # インタラクションが既に終了しているか確認して送信
+            if interaction.response.is_done():
+                await interaction.followup.send(f"❌ エラーが発生しました: {error}", ephemeral=True)
+            else:
+                await interaction.response.send_message(f"❌ エラーが発生しました: {error}", ephemeral=True)
 
-if __name__ == "__main__":
+def main():
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         logging.error("❌ DISCORD_TOKENが見つかりません。環境変数を確認してください。")
-    else:
-        bot.run(token)
+        return
+    RumiaBot().run(token)
+
+# 画像描画のワーカー (spawn) はこのファイルを __mp_main__ として読み込み直すので、
+# モジュールの読み込みだけでは Bot を作らない
+if __name__ == "__main__":
+    main()
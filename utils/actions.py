@@ -0,0 +1,176 @@
+import discord
+import asyncio
+import datetime
+import logging
+import time
+from collections import defaultdict, deque
+
+class ModerationQueue:
+    """AutoModの処罰 (削除・タイムアウト・通知) をまとめて実行するキュー
+
+    - メッセージ削除はチャンネルごとに delete_messages で一括削除
+    - 同じメンバーへのタイムアウトは有効期間中は重複して送らない
+    - 通知メッセージの後片付けは共有タイマー1つで行う
+    """
+
+    def __init__(self, batch_interval=1.0, timeout_minutes=10, notice_ttl=10.0):
+        self.batch_interval = batch_interval
+        self.timeout_duration = datetime.timedelta(minutes=timeout_minutes)
+        self.notice_ttl = notice_ttl
+
+        self.queue = asyncio.Queue()
+        self.worker = None
+        self.cleanup_task = None
+        self.closing = False
+        self.timed_out = {}     # (guild_id, user_id) -> タイムアウト終了時刻 (monotonic)
+        self.notices = deque()  # (削除予定時刻, メッセージ) ※TTLが一定なので時刻順に並ぶ
+
+        # メトリクス
+        self.batches = 0
+        self.actions = 0
+        self.max_batch = 0
+        self.bulk_deletes = 0
+        self.timeouts = 0
+        self.skipped_timeouts = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        if self.worker is None:
+            self.closing = False
+            self.worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=10.0):
+        """キューに残った処罰を処理してから止める (timeout 秒で打ち切り)"""
+        if self.worker:
+            self.closing = True
+            self.queue.put_nowait(None) # 待機中のワーカーを起こす
+            try:
+                await asyncio.wait_for(self.worker, timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"⚠️ AutoModの処罰キューを処理しきれませんでした (残り{self.queue.qsize()}件)")
+        if self.cleanup_task:
+            self.cleanup_task.cancel()
+        # 残っている通知は期限を待たずに消す
+        notices, self.notices = list(self.notices), deque()
+        await self._delete_notices(n for _, n in notices)
+        self.worker = self.cleanup_task = None
+
+    def submit(self, message, reason):
+        """違反メッセージを処罰キューに積む (すぐに戻る)"""
+        self.queue.put_nowait((time.monotonic(), message, reason))
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            batch = [] if item is None else [item]
+            # 少し待って同時期の違反をまとめる (停止中は待たずに残りを処理する)
+            if not self.closing:
+                await asyncio.sleep(self.batch_interval)
+            while not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is not None:
+                    batch.append(item)
+            if batch:
+                try:
+                    await self._process(batch)
+                except Exception as e:
+                    logging.error(f"AutoMod Error: {e}")
+            if self.closing:
+                return
+
+    async def _process(self, batch):
+        now = time.monotonic()
+        self.timed_out = {k: v for k, v in self.timed_out.items() if v > now}
+
+        by_channel = defaultdict(list)
+        targets = {}
+        for _, message, reason in batch:
+            by_channel[message.channel].append(message)
+            key = (message.guild.id, message.author.id)
+            if key in targets or key in self.timed_out:
+                self.skipped_timeouts += 1
+            else:
+                targets[key] = (message.author, message.channel, reason)
+
+        # 1. チャンネルごとに一括削除 (1回100件まで)
+        # 1回の失敗でバッチ全体 (後続のタイムアウト・通知) を落とさないよう、APIエラーは呼び出しごとに処理する
+        for channel, messages in by_channel.items():
+            for i in range(0, len(messages), 100):
+                chunk = messages[i:i + 100]
+                try:
+                    await channel.delete_messages(chunk)
+                    self.bulk_deletes += 1
+                except (discord.Forbidden, discord.NotFound):
+                    pass
+                except discord.HTTPException as e:
+                    # 14日より古いメッセージを含む場合などは一括削除できないので1件ずつ消す
+                    logging.warning(f"⚠️ AutoMod: 一括削除に失敗したため個別に削除します: {e}")
+                    for message in chunk:
+                        await self._call(message.delete())
+
+        # 2. メンバーごとに1回だけタイムアウト + 通知
+        minutes = int(self.timeout_duration.total_seconds() // 60)
+        for key, (member, channel, reason) in targets.items():
+            if not await self._call(member.timeout(self.timeout_duration, reason=f"AutoMod: {reason}")):
+                continue
+            self.timed_out[key] = now + self.timeout_duration.total_seconds()
+            self.timeouts += 1
+            notice = await self._call(channel.send(f"🔒 {member.mention} を{reason}で{minutes}分間タイムアウトしました。"))
+            if notice:
+                self.notices.append((time.monotonic() + self.notice_ttl, notice))
+        if self.notices and (self.cleanup_task is None or self.cleanup_task.done()):
+            self.cleanup_task = asyncio.create_task(self._cleanup_notices())
+
+        done = time.monotonic()
+        for queued_at, _, _ in batch:
+            latency = done - queued_at
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        self.batches += 1
+        self.actions += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+
+    async def _call(self, coro):
+        """Discord APIを1回呼ぶ。失敗したら None (権限不足・削除済み以外はログに残す)"""
+        try:
+            result = await coro
+        except (discord.Forbidden, discord.NotFound):
+            return None
+        except discord.HTTPException as e:
+            self.errors += 1
+            logging.error(f"AutoMod Error: {e}")
+            return None
+        return True if result is None else result
+
+    async def _delete_notices(self, notices):
+        by_channel = defaultdict(list)
+        for notice in notices:
+            by_channel[notice.channel].append(notice)
+        for channel, messages in by_channel.items():
+            await self._call(channel.delete_messages(messages))
+
+    async def _cleanup_notices(self):
+        """期限の来た通知をチャンネルごとにまとめて削除する共有タイマー"""
+        while self.notices:
+            await asyncio.sleep(max(0, self.notices[0][0] - time.monotonic()))
+            now = time.monotonic()
+            expired = []
+            while self.notices and self.notices[0][0] <= now:
+                expired.append(self.notices.popleft()[1])
+            await self._delete_notices(expired)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "batches": self.batches,
+            "avg_batch": f"{self.actions / self.batches if self.batches else 0:.1f}",
+            "max_batch": self.max_batch,
+            "bulk_deletes": self.bulk_deletes,
+            "timeouts": self.timeouts,
+            "skipped_timeouts": self.skipped_timeouts,
+            "errors": self.errors,
+            "avg_latency": f"{(self.total_latency / self.actions * 1000) if self.actions else 0:.0f}ms",
+            "max_latency": f"{self.max_latency * 1000:.0f}ms",
+        }
@@ -0,0 +1,89 @@
+import re
+import string
+from functools import lru_cache
+
+# ルール名 -> 正規表現 (ルールごとに search する。1つにまとめた選択 | は個別に走査するより遅かった)
+# 重複文字は他のルールより先に試すため先頭に置く
+# caps は文字ごとにマッチを作ると遅いので正規表現に入れず、スキャン後にバイト列の translate で数える
+RULE_PATTERNS = {
+    "repeat": r"(.)\1{9,}",
+    # "https://www." の有無は判定に関係ないので "discord" から始めて先頭の候補位置を減らす
+    "invite": r"(?i:discord(?:\.gg|(?:app)?\.com/invite)/[\w-]+)",
+    "zalgo": r"[\u0300-\u036f\u0483-\u0489\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]{3,}",
+    "mention": r"<@[!&]?\d+>|@everyone|@here",
+}
+
+# 含まれていなければマッチしようがない文字列 (invite は小文字にして調べる)。無ければ走査しない
+RULE_HINTS = {
+    "invite": "discord",
+    "mention": "@",
+}
+
+RULE_REASONS = {
+    "repeat": "重複文字スパム",
+    "invite": "招待リンク",
+    "zalgo": "Zalgoテキスト",
+    "mention": "大量メンション",
+    "caps": "大文字の多用",
+}
+
+# automod_level ごとに有効になるルール
+# flood は正規表現ではなく FloodDetector (utils/flood.py) で判定する
+LEVEL_RULES = {
+    1: ("repeat",),
+    2: ("repeat", "invite", "zalgo", "flood"),
+    3: ("repeat", "invite", "zalgo", "flood", "mention", "caps"),
+}
+
+MENTION_LIMIT = 5     # 1メッセージ内のメンション数の上限
+CAPS_MIN_LETTERS = 10 # 大文字率を判定する最低文字数
+CAPS_RATIO = 0.7      # これ以上が大文字なら違反
+
+_UPPER = string.ascii_uppercase.encode()
+_LOWER = string.ascii_lowercase.encode()
+
+class AutoModRules:
+    """有効なルールのコンパイル済み正規表現でメッセージを判定するスキャナ
+
+    招待リンク・メンションは目印の文字列があるときだけ走査し、大文字率はバイト列の translate で数える。
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.patterns = [(r, re.compile(RULE_PATTERNS[r])) for r in self.rules
+                         if r in RULE_PATTERNS and r not in RULE_HINTS]
+        self.invite = re.compile(RULE_PATTERNS["invite"]) if "invite" in self.rules else None
+        self.mention = re.compile(RULE_PATTERNS["mention"]) if "mention" in self.rules else None
+        self.count_caps = "caps" in self.rules
+        self.flood = "flood" in self.rules
+
+    def check(self, content):
+        """違反していれば理由を、問題なければNoneを返す"""
+        for rule, pattern in self.patterns:
+            if pattern.search(content):
+                return RULE_REASONS[rule]
+
+        if self.invite and RULE_HINTS["invite"] in content.lower() and self.invite.search(content):
+            return RULE_REASONS["invite"]
+
+        if self.mention and RULE_HINTS["mention"] in content:
+            mentions = 0
+            for _ in self.mention.finditer(content):
+                mentions += 1
+                if mentions >= MENTION_LIMIT:
+                    return RULE_REASONS["mention"]
+
+        if self.count_caps:
+            # ASCII以外を捨てたバイト列から大文字・小文字を消した差で数える (Cのループ1回ずつ)
+            ascii_only = content.encode("ascii", "ignore")
+            upper = len(ascii_only) - len(ascii_only.translate(None, _UPPER))
+            letters = upper + len(ascii_only) - len(ascii_only.translate(None, _LOWER))
+            if letters >= CAPS_MIN_LETTERS and upper / letters >= CAPS_RATIO:
+                return RULE_REASONS["caps"]
+        return None
+
+@lru_cache(maxsize=None)
+def compile_rules(level):
+    """レベルに対応するコンパイル済みルールセット (同じレベルのギルド間で共有)"""
+    level = min(max(level, 1), max(LEVEL_RULES))
+    return AutoModRules(LEVEL_RULES[level])
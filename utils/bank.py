@@ -0,0 +1,244 @@
+import sys
+import time
+from utils.cache import LRUCache
+from utils.writebehind import BalanceBuffer
+
+USER_FIELDS = ("id", "cash", "bank", "debt", "job_id", "last_daily", "last_work", "xp", "level", "bio")
+
+class UserRecord:
+    """usersテーブル1行分のキャッシュ (record['cash'] のようにRecordと同じ形で読める)"""
+    __slots__ = USER_FIELDS + ("loaded",)
+
+    def __init__(self, row):
+        for field in USER_FIELDS:
+            setattr(self, field, row[field])
+        self.loaded = time.perf_counter()
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def copy(self):
+        record = object.__new__(UserRecord)
+        for field in self.__slots__:
+            setattr(record, field, getattr(self, field))
+        return record
+
+class Bank:
+    """経済操作の窓口 (Economy / RPG Cog から使う)
+
+    残高チェック・更新・ユーザー行の作成を1ステートメントで行い、更新後の行を返す。
+    条件を満たさない場合 (残高不足など) は何も更新せず None を返す。
+    返した行はLRUキャッシュに載せ、次の読み取りはDBに問い合わせない。
+    usersテーブルを直接更新した場合は invalidate() を呼ぶこと。
+    少しずつ直接更新する間 (定期処理) は suspend() 〜 resume() で囲み、その間はキャッシュを使わない。
+    DBで確定した総資産 (cash + bank) は listeners に (user_id, 総資産) で通知する。
+    ledger を渡すと、成功した増減を kind (コマンド名など) 付きで取引履歴に記録する。
+
+    write_behind=True の場合、無条件の入金 (credit) はメモリに貯めてまとめて書き込む。
+    読み取りには未反映分を足した値を返し、残高を確認する操作では未反映分を同じSQLで反映する。
+    キャッシュ済みのユーザーの賭け (charge) はメモリ上で判定してDBには書き込みまで触れない。
+    """
+
+    def __init__(self, db, ledger=None, write_behind=False, cache_size=200_000, cache_ttl=600):
+        self.db = db
+        self.ledger = ledger
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.buffer = BalanceBuffer(db, on_flush=self._on_flush) if write_behind else None
+        self.listeners = []
+        self._busy = {} # user_id -> 実行中のSQL操作数 (write-behind 時)
+        self._suspended = 0 # 実行中の定期処理の数 (0より大きい間はキャッシュに載せず、charge もSQLで判定する)
+
+    def start(self):
+        if self.buffer:
+            self.buffer.start()
+
+    async def close(self):
+        """終了時に未反映の増減を書き込む"""
+        if self.buffer:
+            await self.buffer.close()
+
+    # --- キャッシュ ---
+    def _store(self, row):
+        if row is None:
+            return None
+        record = UserRecord(row)
+        if not self._suspended:
+            self.cache.set(record.id, record)
+        self._notify(record.id, record.cash + record.bank)
+        return record
+
+    def _notify(self, user_id, worth):
+        for listener in self.listeners:
+            listener(user_id, worth)
+
+    def _log(self, user_id, kind, cash=0, bank=0, debt=0, counterparty=None):
+        if self.ledger:
+            self.ledger.record(user_id, kind, cash, bank, debt, counterparty)
+
+    def _view(self, record):
+        """未反映の増減を足した行を返す"""
+        if record is None or not self.buffer:
+            return record
+        pending = self.buffer.get(record.id)
+        if not pending:
+            return record
+        view = record.copy()
+        view.cash += pending
+        return view
+
+    def _on_flush(self, batch, started, rows):
+        """まとめ書き込み後、キャッシュの現金を書き込み後の値に合わせる"""
+        for row in rows:
+            self._notify(row['id'], row['cash'] + row['bank'])
+        for user_id, delta in batch.items():
+            record = self.cache.peek(user_id)
+            if record is None:
+                continue
+            if record.loaded < started:
+                record.cash += delta
+            else:
+                # 書き込み中に読み直した行は反映済みか分からないので捨てる
+                self.cache.pop(user_id)
+
+    def invalidate(self, user_id=None):
+        """usersテーブルを直接更新したときに呼ぶ (Noneなら全件)"""
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(user_id)
+
+    def suspend(self):
+        """usersテーブルの直接更新を始める (resume() までキャッシュを使わない)"""
+        self._suspended += 1
+        self.cache.clear()
+
+    def resume(self):
+        """直接更新が終わった (途中で失敗した場合も呼ぶ)。更新前の行が残らないようキャッシュを捨てる"""
+        self._suspended -= 1
+        self.cache.clear()
+
+    async def _checked(self, method, query, user_id, *args):
+        """未反映分を取り出して同じステートメントで反映する (失敗したら戻す)
+
+        write-behind 時は書き込み中のバッチを待ってからDBの残高で判定する
+        (書き込み中の減額をDBがまだ知らないまま判定すると二重に使えてしまう)。
+        実行中はそのユーザーの charge もメモリ上で判定せずこちらを通す。
+        """
+        if not self.buffer:
+            return await getattr(self.db, method)(query, user_id, *args, 0)
+        self._busy[user_id] = self._busy.get(user_id, 0) + 1
+        try:
+            await self.buffer.wait_flushed()
+            pending = self.buffer.take(user_id)
+            try:
+                result = await getattr(self.db, method)(query, user_id, *args, pending)
+            except BaseException:
+                if pending:
+                    self.buffer.add(user_id, pending)
+                raise
+            if not result and pending:
+                self.buffer.add(user_id, pending)
+            return result
+        finally:
+            self._busy[user_id] -= 1
+            if not self._busy[user_id]:
+                del self._busy[user_id]
+
+    # --- 操作 ---
+    async def get_user(self, user_id):
+        """ユーザー行を取得 (無ければ作成)"""
+        record = self.cache.get(user_id)
+        if record is None:
+            record = self._store(await self.db.fetchrow("users.get_or_create", user_id))
+        return self._view(record)
+
+    async def credit(self, user_id, amount, kind="credit"):
+        """現金を増やす (無ければ作成)。write-behind 時は後でまとめて書き込み、None を返す"""
+        if self.buffer:
+            self.buffer.add(user_id, amount)
+            self._log(user_id, kind, cash=amount)
+            return None
+        record = self._store(await self.db.fetchrow("users.credit", user_id, amount))
+        self._log(user_id, kind, cash=amount)
+        return record
+
+    async def charge(self, user_id, delta, required, kind="charge"):
+        """所持金が required 以上なら現金を delta だけ増減する (賭け・支払い用)"""
+        # 書き込み中のバッチ・同じユーザーのSQL操作・定期処理がある間はキャッシュが正とは限らないのでSQLで判定する
+        if self.buffer and not self.buffer.flushing and not self._suspended and user_id not in self._busy:
+            record = self.cache.get(user_id)
+            if record is not None:
+                # キャッシュが正なのでメモリ上で判定して増減だけ貯める
+                if record.cash + self.buffer.get(user_id) < required:
+                    return None
+                self.buffer.add(user_id, delta)
+                self._log(user_id, kind, cash=delta)
+                return self._view(record)
+        row = await self._checked("fetchrow", "users.charge", user_id, delta, required)
+        if row:
+            self._log(user_id, kind, cash=delta)
+        return self._view(self._store(row))
+
+    async def transfer(self, sender_id, receiver_id, amount):
+        """送金。成功すれば (送金者の行, 受取人の行)、残高不足なら None"""
+        rows = await self._checked("fetch", "users.transfer", sender_id, receiver_id, amount)
+        by_id = {row['id']: self._view(self._store(row)) for row in rows}
+        if sender_id not in by_id:
+            return None
+        self._log(sender_id, "send", cash=-amount, counterparty=receiver_id)
+        self._log(receiver_id, "receive", cash=amount, counterparty=sender_id)
+        return by_id[sender_id], by_id.get(receiver_id)
+
+    async def borrow(self, user_id, amount):
+        """借金 (上限を超える場合は None)"""
+        row = await self._checked("fetchrow", "users.borrow", user_id, amount)
+        if row:
+            self._log(user_id, "borrow", cash=amount, debt=amount)
+        return self._view(self._store(row))
+
+    async def repay(self, user_id, amount):
+        """返済 (借金の残りまで)。成功すれば (行, 返済額)、借金なし・現金不足なら None"""
+        row = await self._checked("fetchrow", "users.repay", user_id, amount)
+        if row is None:
+            return None
+        self._log(user_id, "repay", cash=-row['repaid'], debt=-row['repaid'])
+        return self._view(self._store(row)), row['repaid']
+
+    async def buy_job(self, user_id, job_id, cost):
+        """転職 (現金不足なら None)"""
+        row = await self._checked("fetchrow", "users.buy_job", user_id, cost, job_id)
+        if row:
+            self._log(user_id, "shop", cash=-cost)
+        return self._view(self._store(row))
+
+    async def work(self, user_id, earnings, now, ready_before):
+        """労働報酬の付与 (last_work が ready_before より後ならクールダウン中として None)"""
+        row = await self.db.fetchrow("users.work", user_id, earnings, now, ready_before)
+        if row:
+            self._log(user_id, "work", cash=earnings)
+        return self._view(self._store(row))
+
+    # --- 統計 ---
+    def memory_usage(self, sample=200):
+        """キャッシュの概算メモリ使用量 (先頭 sample 件の平均から推定, bytes)"""
+        count = len(self.cache)
+        if not count:
+            return 0
+        total = n = 0
+        for record in self.cache.values():
+            total += sys.getsizeof(record) + sum(sys.getsizeof(getattr(record, f)) for f in UserRecord.__slots__)
+            n += 1
+            if n >= sample:
+                break
+        # OrderedDict のエントリ・キー・(値, 期限, バイト数) タプル分も概算で足す
+        per_entry = total / n + 150
+        return int(per_entry * count)
+
+    def stats(self):
+        cache = self.cache.stats()
+        cache["memory"] = f"{self.memory_usage() / 1024 / 1024:.1f}MB"
+        return {
+            "ユーザーキャッシュ": cache,
+            "残高バッファ": self.buffer.stats() if self.buffer else {"write_behind": "off"},
+            "取引履歴": self.ledger.stats() if self.ledger else {"ledger": "off"},
+        }
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """サイズ上限付きのLRUキャッシュ (ヒット・ミス・追い出し回数を記録)
+
+    ttl (秒) を指定すると、期限切れのエントリはミスとして扱い削除する。
+    maxbytes を指定すると、sizeof(value) の合計がそれを超えないように追い出す (画像のバイト列など)。
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data = OrderedDict() # key -> (value, 期限 or None, バイト数)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        try:
+            value, expires, _ = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if expires is not None and expires < time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """統計やLRU順を変えずに値を見る (期限切れでも返す)"""
+        entry = self._data.get(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        size = self.sizeof(value) if self.maxbytes else 0
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (value, expires, size)
+        self.bytes += size
+        # 上限を超えたら最も使われていないものから追い出す
+        while len(self._data) > self.maxsize or (self.maxbytes and self.bytes > self.maxbytes and len(self._data) > 1):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self.bytes -= entry[2]
+        return entry
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+        return self._remove(key)[0]
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def values(self):
+        return (entry[0] for entry in self._data.values())
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": f"{(self.hits / total * 100) if total else 0:.1f}%",
+        }
+        if self.ttl:
+            stats["expirations"] = self.expirations
+        if self.maxbytes:
+            stats["bytes"] = f"{self.bytes / 1024 / 1024:.1f}/{self.maxbytes / 1024 / 1024:.0f}MB"
+        return stats
@@ -0,0 +1,85 @@
+import time
+
+class Cooldowns:
+    """(ユーザー, 操作) 単位のクールダウン (ハッシュ化タイミングホイールで失効させる)
+
+    クールダウン中のキーだけを expires に持つので、操作の種類が増えてもユーザーあたりのメモリは増えない。
+    再起動直後など記録が無いキーは remaining() が0を返すので、呼び出し側でDBの最終実行時刻を読み
+    seed() で登録する (以降の連打はDBに触れずに弾ける)。
+    時刻はDBのタイムスタンプと比べるため time.time() (UNIX時刻) を使う。
+    """
+
+    def __init__(self, resolution=10, slots=512):
+        self.expires = {} # (user_id, action) -> 解除時刻
+        # タイミングホイール: resolution 秒ごとのスロット。1周より先に失効するキーは次の周まで残る
+        self.resolution = resolution
+        self.wheel = [set() for _ in range(slots)]
+        self.tick = int(time.time() // resolution)
+        self.rejections = 0
+        self.seeds = 0
+        self.evictions = 0
+
+    def _advance(self, now):
+        now_tick = int(now // self.resolution)
+        steps = min(now_tick - self.tick, len(self.wheel))
+        for i in range(1, steps + 1):
+            bucket = self.wheel[(self.tick + i) % len(self.wheel)]
+            for key in list(bucket):
+                expires = self.expires.get(key)
+                if expires is None:
+                    bucket.discard(key)
+                elif expires <= now:
+                    del self.expires[key]
+                    bucket.discard(key)
+                    self.evictions += 1
+                # まだ先 (次の周以降) なら残す
+        self.tick = max(self.tick, now_tick)
+
+    def remaining(self, user_id, action, now=None):
+        """残りのクールダウン秒数 (記録が無い・解除済みなら0)"""
+        now = time.time() if now is None else now
+        if now >= (self.tick + 1) * self.resolution:
+            self._advance(now)
+        expires = self.expires.get((user_id, action))
+        if expires is None or expires <= now:
+            return 0
+        self.rejections += 1
+        return expires - now
+
+    def trigger(self, user_id, action, duration, now=None):
+        """操作を実行した時点からクールダウンを始める"""
+        now = time.time() if now is None else now
+        self._set((user_id, action), now + duration)
+
+    def seed(self, user_id, action, last_used, duration, now=None):
+        """DBの最終実行時刻 (datetime) から登録し、残り秒数を返す"""
+        if last_used is None:
+            return 0
+        self.seeds += 1
+        now = time.time() if now is None else now
+        expires = last_used.timestamp() + duration
+        if expires <= now:
+            return 0
+        self._set((user_id, action), expires)
+        return expires - now
+
+    def reset(self, user_id, action):
+        self.expires.pop((user_id, action), None)
+
+    def _set(self, key, expires):
+        old = self.expires.get(key)
+        self.expires[key] = expires
+        slot = int(expires // self.resolution) % len(self.wheel)
+        if old is not None:
+            old_slot = int(old // self.resolution) % len(self.wheel)
+            if old_slot != slot:
+                self.wheel[old_slot].discard(key)
+        self.wheel[slot].add(key)
+
+    def stats(self):
+        return {
+            "active": len(self.expires),
+            "rejections": self.rejections,
+            "seeds": self.seeds,
+            "evictions": self.evictions,
+        }
@@ -1,11 +1,317 @@
 import asyncpg
 import os
 import logging
+import time
+from contextlib import asynccontextmanager
+from utils.migrations import migrate
+
+# --- 名前付きクエリ ---
+# Cogからは名前で呼び出す (例: db.fetchrow("users.get", user_id))。
+# 名前付きクエリは接続ごとに1回だけprepareされ、実行時間などの統計が名前ごとに記録される。
+QUERIES = {
+    # 自動応答
+    "auto_responses.by_guild": "SELECT * FROM auto_responses WHERE guild_id = $1 ORDER BY id",
+    "auto_responses.list": "SELECT id, trigger, response FROM auto_responses WHERE guild_id = $1 ORDER BY id",
+    "auto_responses.add": "INSERT INTO auto_responses (guild_id, trigger, response, reaction) VALUES ($1, $2, $3, $4) RETURNING *",
+    "auto_responses.delete": "DELETE FROM auto_responses WHERE id = $1 AND guild_id = $2",
+
+    # サーバー設定・ホワイトリスト
+    "guilds.get": "SELECT * FROM guilds WHERE id = $1",
+    "whitelist.all": "SELECT user_id FROM admin_whitelist",
+    "whitelist.add": "INSERT INTO admin_whitelist (user_id) VALUES ($1) ON CONFLICT DO NOTHING",
+
+    # 経済 (utils/bank.py の Bank から使う。残高チェック・更新・行作成を1ステートメントで行う)
+    # 残高を確認するクエリは最後の引数に write-behind で未反映の増減を受け取り、同時に反映する
+    "users.get_or_create": """
+        WITH ins AS (
+            INSERT INTO users (id) VALUES ($1) ON CONFLICT (id) DO NOTHING RETURNING *
+        )
+        SELECT * FROM ins UNION ALL SELECT * FROM users WHERE id = $1 LIMIT 1
+    """,
+    "users.credit": """
+        INSERT INTO users (id, cash) VALUES ($1, $2)
+        ON CONFLICT (id) DO UPDATE SET cash = users.cash + EXCLUDED.cash
+        RETURNING *
+    """,
+    # write-behind のまとめ書き込み ($1: ユーザーID配列, $2: 増減配列)
+    "users.apply_deltas": """
+        INSERT INTO users (id, cash) SELECT * FROM unnest($1::bigint[], $2::bigint[])
+        ON CONFLICT (id) DO UPDATE SET cash = users.cash + EXCLUDED.cash
+        RETURNING id, cash, bank
+    """,
+    # $2: 現金の増減, $3: 必要な所持金 (足りなければ行を返さない)
+    "users.charge": "UPDATE users SET cash = cash + $4 + $2 WHERE id = $1 AND cash + $4 >= $3 RETURNING *",
+    "users.transfer": """
+        WITH debit AS (
+            UPDATE users SET cash = cash + $4 - $3 WHERE id = $1 AND cash + $4 >= $3 RETURNING *
+        ), credit AS (
+            INSERT INTO users (id, cash) SELECT $2::bigint, $3::bigint FROM debit
+            ON CONFLICT (id) DO UPDATE SET cash = users.cash + EXCLUDED.cash
+            RETURNING *
+        )
+        SELECT * FROM debit UNION ALL SELECT * FROM credit
+    """,
+    # 借金上限は max(10000, 総資産の50%)。新規ユーザーは総資産0なので10000まで
+    "users.borrow": """
+        INSERT INTO users (id, cash, debt)
+        SELECT $1::bigint, $2::bigint + $3::bigint, $2::bigint WHERE $2 <= 10000 OR EXISTS (SELECT 1 FROM users WHERE id = $1)
+        ON CONFLICT (id) DO UPDATE SET cash = users.cash + $3 + $2, debt = users.debt + $2
+        WHERE users.debt + $2 <= GREATEST(10000, (users.cash + $3 + users.bank) / 2)
+        RETURNING *
+    """,
+    "users.repay": """
+        WITH cur AS (
+            SELECT id, LEAST($2, debt) AS amount FROM users WHERE id = $1 FOR UPDATE
+        )
+        UPDATE users u SET cash = u.cash + $3 - cur.amount, debt = u.debt - cur.amount
+        FROM cur WHERE u.id = cur.id AND cur.amount > 0 AND u.cash + $3 >= cur.amount
+        RETURNING u.*, cur.amount AS repaid
+    """,
+    "users.buy_job": "UPDATE users SET cash = cash + $4 - $2, job_id = $3 WHERE id = $1 AND cash + $4 >= $2 RETURNING *",
+    # $4 より前に働いていればクールダウン明け (同時実行されても二重に稼げない)
+    "users.work": """
+        UPDATE users SET cash = cash + $2, last_work = $3
+        WHERE id = $1 AND (last_work IS NULL OR last_work <= $4)
+        RETURNING *
+    """,
+
+    # ランキング (utils/leaderboard.py)
+    "users.net_worth": "SELECT cash + bank FROM users WHERE id = $1",
+    "users.net_worth_all": "SELECT id, cash + bank AS worth FROM users",
+    "users.top_net_worth": "SELECT id, cash + bank AS worth FROM users ORDER BY (cash + bank) DESC LIMIT $1",
+    "users.top_net_worth_in": """
+        SELECT id, cash + bank AS worth FROM users
+        WHERE id = ANY($1::bigint[]) ORDER BY (cash + bank) DESC LIMIT $2
+    """,
+
+    # 国家
+    "nations.exists": "SELECT 1 FROM nations WHERE user_id = $1",
+    # last_update はDBの時刻 (DEFAULT) ではなく utils/nation.accrue と同じPython側の時刻を入れる
+    "nations.create": "INSERT INTO nations (user_id, name, last_update) VALUES ($1, $2, $3)",
+    "nations.get": "SELECT * FROM nations WHERE user_id = $1",
+    "nations.get_for_update": "SELECT * FROM nations WHERE user_id = $1 FOR UPDATE",
+    # 全国家イベント (utils/nation_events.py)。全行をロックして読み、配列のまま1つのUPDATEで書き戻す
+    "nations.all_for_update": """
+        SELECT user_id, population, resources, army, tax_rate, treasury, last_update
+        FROM nations ORDER BY user_id FOR UPDATE
+    """,
+    "nations.bulk_update": """
+        UPDATE nations n SET population = u.population, resources = u.resources, army = u.army,
+            treasury = u.treasury, last_update = $6
+        FROM unnest($1::bigint[], $2::bigint[], $3::bigint[], $4::bigint[], $5::bigint[])
+            AS u(user_id, population, resources, army, treasury)
+        WHERE n.user_id = u.user_id
+    """,
+    # 人口・資源は utils/nation.py で $4 時点まで進めた値。未徴収の税収は0に戻す
+    "nations.collect": """
+        UPDATE nations SET population = $2, resources = $3, treasury = 0, last_update = $4, last_collect = $4
+        WHERE user_id = $1
+    """,
+
+    # 経済の定期処理 (utils/maintenance.py)
+    # $1: 前回のチャンクの最後のID, $2: チャンクの件数。id順に区切って1チャンクずつ更新し、
+    # 増減は同じステートメントで取引履歴にも書き込む (created_at は Ledger と同じくPython側の時刻を渡す)
+    "maintenance.debt_interest": """
+        WITH batch AS (
+            SELECT id, CEIL(debt * $3::float8)::bigint AS delta FROM users WHERE id > $1 ORDER BY id LIMIT $2
+        ), upd AS (
+            UPDATE users u SET debt = u.debt + batch.delta
+            FROM batch WHERE u.id = batch.id AND batch.delta > 0
+            RETURNING u.id, batch.delta
+        ), log AS (
+            INSERT INTO economy_transactions (user_id, kind, debt_delta, created_at)
+            SELECT id, 'debt_interest', delta, $4 FROM upd
+        )
+        SELECT (SELECT MAX(id) FROM batch) AS last_id, (SELECT COUNT(*) FROM upd) AS touched
+    """,
+    "maintenance.bank_interest": """
+        WITH batch AS (
+            SELECT id, FLOOR(bank * $3::float8)::bigint AS delta FROM users WHERE id > $1 ORDER BY id LIMIT $2
+        ), upd AS (
+            UPDATE users u SET bank = u.bank + batch.delta
+            FROM batch WHERE u.id = batch.id AND batch.delta > 0
+            RETURNING u.id, batch.delta
+        ), log AS (
+            INSERT INTO economy_transactions (user_id, kind, bank_delta, created_at)
+            SELECT id, 'bank_interest', delta, $4 FROM upd
+        )
+        SELECT (SELECT MAX(id) FROM batch) AS last_id, (SELECT COUNT(*) FROM upd) AS touched
+    """,
+    # $4 を超える現金の $3 を減らす ($5 より後に work / daily していないユーザーのみ。一度もしていないユーザーも対象)
+    "maintenance.inactivity_decay": """
+        WITH batch AS (
+            SELECT id, CASE WHEN cash > $4 AND COALESCE(GREATEST(last_work, last_daily), '-infinity') < $5
+                            THEN FLOOR((cash - $4) * $3::float8)::bigint ELSE 0 END AS delta
+            FROM users WHERE id > $1 ORDER BY id LIMIT $2
+        ), upd AS (
+            UPDATE users u SET cash = u.cash - batch.delta
+            FROM batch WHERE u.id = batch.id AND batch.delta > 0
+            RETURNING u.id, batch.delta
+        ), log AS (
+            INSERT INTO economy_transactions (user_id, kind, cash_delta, created_at)
+            SELECT id, 'inactivity_decay', -delta, $6 FROM upd
+        )
+        SELECT (SELECT MAX(id) FROM batch) AS last_id, (SELECT COUNT(*) FROM upd) AS touched
+    """,
+    "maintenance.runs": "SELECT job, last_run, run_started, progress_id FROM maintenance_runs",
+    # 実行中のジョブの途中経過 ($2: 実行開始時刻, $3: 更新済みの最後のID)。チャンクと同じトランザクションで書く
+    "maintenance.progress": """
+        INSERT INTO maintenance_runs (job, run_started, progress_id) VALUES ($1, $2, $3)
+        ON CONFLICT (job) DO UPDATE SET run_started = $2, progress_id = $3
+    """,
+    "maintenance.record": """
+        INSERT INTO maintenance_runs (job, last_run, rows_touched, duration) VALUES ($1, $2, $3, $4)
+        ON CONFLICT (job) DO UPDATE SET last_run = $2, rows_touched = $3, duration = $4,
+                                        run_started = NULL, progress_id = NULL
+    """,
+
+    # 取引履歴 (utils/ledger.py)
+    "ledger.min_id": "SELECT MIN(id) FROM economy_transactions",
+    "ledger.compact_upper": "SELECT MAX(id) FROM economy_transactions WHERE created_at < $1",
+    # id が ($1, $2] の履歴を削除してユーザーごとにスナップショットへ足し込む
+    "ledger.compact": """
+        WITH moved AS (
+            DELETE FROM economy_transactions WHERE id > $1 AND id <= $2 RETURNING *
+        ), merged AS (
+            INSERT INTO economy_snapshots AS s (user_id, cash, bank, debt, last_tx_id, taken_at)
+            SELECT user_id, SUM(cash_delta), SUM(bank_delta), SUM(debt_delta), MAX(id), now()
+            FROM moved GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                cash = s.cash + EXCLUDED.cash, bank = s.bank + EXCLUDED.bank, debt = s.debt + EXCLUDED.debt,
+                last_tx_id = EXCLUDED.last_tx_id, taken_at = EXCLUDED.taken_at
+        )
+        SELECT COUNT(*) FROM moved
+    """,
+    "ledger.snapshots": "SELECT user_id, cash, bank, debt FROM economy_snapshots",
+    "ledger.snapshots_of": "SELECT user_id, cash, bank, debt FROM economy_snapshots WHERE user_id = $1",
+    "ledger.entries": "SELECT user_id, cash_delta, bank_delta, debt_delta FROM economy_transactions ORDER BY id",
+    "ledger.entries_of": """
+        SELECT user_id, cash_delta, bank_delta, debt_delta FROM economy_transactions
+        WHERE user_id = $1 ORDER BY id
+    """,
+
+    # /fake の Webhook (utils/webhooks.py)
+    "webhooks.get": "SELECT webhook_id, token FROM webhook_cache WHERE channel_id = $1",
+    "webhooks.set": """
+        INSERT INTO webhook_cache (channel_id, guild_id, webhook_id, token) VALUES ($1, $2, $3, $4)
+        ON CONFLICT (channel_id) DO UPDATE SET webhook_id = $3, token = $4
+    """,
+    "webhooks.delete": "DELETE FROM webhook_cache WHERE channel_id = $1",
+
+    # おみくじ
+    "omikuji.by_guild": "SELECT * FROM omikuji_settings WHERE guild_id = $1",
+    "omikuji.add": "INSERT INTO omikuji_settings (guild_id, result_name, description, probability) VALUES ($1, $2, $3, $4)",
+}
+
+# レイテンシヒストグラムのバケット境界 (ms)
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+class RumiaConnection(asyncpg.Connection):
+    """名前付きクエリのPreparedStatementを接続ごとに保持する接続クラス"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+class QueryStats:
+    """1クエリ分の統計 (回数・時間・行数・プール待ち時間・ヒストグラム)"""
+    __slots__ = ("calls", "total", "max", "rows", "pool_wait", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.pool_wait = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, elapsed, wait, rows):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += rows
+        self.pool_wait += wait
+        ms = elapsed * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    @property
+    def avg(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, q):
+        """ヒストグラムから q (0〜1) 分位点の上限を ms で返す (最後のバケットなら最大値)"""
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= target:
+                return float(bound)
+        return self.max * 1000
+
+def _row_count(method, result):
+    if method == "fetch":
+        return len(result)
+    if method == "execute":
+        # "UPDATE 3" のようなステータスから件数を取り出す
+        last = result.rsplit(" ", 1)[-1] if result else ""
+        return int(last) if last.isdigit() else 0
+    return 0 if result is None else 1
+
+class Transaction:
+    """Database.transaction() の中で使う接続 (Database と同じ呼び方ができる)"""
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+
+    async def execute(self, query, *args):
+        return await self.db._run("execute", query, args, self.conn)
+
+    async def fetch(self, query, *args):
+        return await self.db._run("fetch", query, args, self.conn)
+
+    async def fetchrow(self, query, *args):
+        return await self.db._run("fetchrow", query, args, self.conn)
+
+    async def fetchval(self, query, *args):
+        return await self.db._run("fetchval", query, args, self.conn)
+
+    async def stream(self, query, *args, prefetch=1000):
+        """このトランザクションの中でカーソルを使って少しずつ読む"""
+        async for row in self.conn.cursor(QUERIES.get(query, query), *args, prefetch=prefetch):
+            yield row
+
+class NullTransaction:
+    """DB未接続時の Database.transaction() (未接続の Database と同じく空の結果を返す)"""
+
+    async def execute(self, query, *args):
+        return None
+
+    async def fetch(self, query, *args):
+        return []
+
+    async def fetchrow(self, query, *args):
+        return None
+
+    async def fetchval(self, query, *args):
+        return None
+
+    async def stream(self, query, *args, prefetch=1000):
+        return
+        yield
 
 class Database:
     def __init__(self):
         self.pool = None
         self.db_url = os.getenv("DATABASE_URL")
+        self.query_stats = {} # クエリ名 (生SQLは先頭部分) -> QueryStats
 
     async def connect(self):
         if not self.db_url:
@@ -13,127 +319,132 @@ class Database:
             return
 
         try:
-            self.pool = await asyncpg.create_pool(self.db_url)
+            self.pool = await asyncpg.create_pool(self.db_url, connection_class=RumiaConnection)
             logging.info("🗄️ データベースに接続しました。")
             await self.initialize_tables()
         except Exception as e:
             logging.error(f"❌ DB接続エラー: {e}")
 
     async def initialize_tables(self):
-        """テーブルとカラムの初期化・修復"""
+        """スキーママイグレーションの適用 (未適用のバージョンだけ実行)"""
         async with self.pool.acquire() as conn:
-            # ユーザーテーブル (経済機能用)
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id BIGINT PRIMARY KEY,
-                    cash BIGINT DEFAULT 0,
-                    bank BIGINT DEFAULT 0,
-                    debt BIGINT DEFAULT 0,
-                    job_id TEXT DEFAULT 'ニート',
-                    last_daily TIMESTAMP,
-                    last_work TIMESTAMP,
-                    xp BIGINT DEFAULT 0,
-                    level INT DEFAULT 1,
-                    bio TEXT DEFAULT 'プロフィールは未設定です。'
-                )
-            """)
-            
-            # カラム追加チェック (既存DBへのパッチ適用)
-            # debtカラムがない場合に備えて追加を試みる
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS debt BIGINT DEFAULT 0")
-                await conn.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS xp BIGINT DEFAULT 0")
-                await conn.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS level INT DEFAULT 1")
-            except Exception as e:
-                logging.warning(f"Column update warning: {e}")
-
-            # サーバー設定テーブル
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS guilds (
-                    id BIGINT PRIMARY KEY,
-                    prefix TEXT DEFAULT '/',
-                    log_channel BIGINT,
-                    welcome_channel BIGINT,
-                    automod_enabled BOOLEAN DEFAULT FALSE,
-                    automod_level INT DEFAULT 1,
-                    verify_role_id BIGINT
-                )
-            """)
-
-            # 自動応答テーブル
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS auto_responses (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT,
-                    trigger TEXT,
-                    response TEXT,
-                    reaction TEXT
-                )
-            """)
-
-            # 警告管理テーブル
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS warnings (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT,
-                    user_id BIGINT,
-                    reason TEXT,
-                    moderator_id BIGINT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 国家戦略テーブル
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS nations (
-                    user_id BIGINT PRIMARY KEY,
-                    name TEXT,
-                    population BIGINT DEFAULT 100,
-                    resources BIGINT DEFAULT 1000,
-                    army BIGINT DEFAULT 0,
-                    tax_rate INT DEFAULT 10
-                )
-            """)
-            
-            # おみくじ設定テーブル
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS omikuji_settings (
-                    id SERIAL PRIMARY KEY,
-                    guild_id BIGINT,
-                    result_name TEXT,
-                    description TEXT,
-                    probability INT
-                )
-            """)
-            
-            # 管理者ホワイトリスト
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS admin_whitelist (
-                    user_id BIGINT PRIMARY KEY
-                )
-            """)
-
+            await migrate(conn)
             logging.info("✅ データベーステーブルの初期化完了")
 
+    async def _prepared(self, conn, name):
+        stmt = conn.prepared.get(name)
+        if stmt is None:
+            stmt = conn.prepared[name] = await conn.prepare(QUERIES[name])
+        return stmt
+
+    async def _call_prepared(self, conn, method, name, args):
+        stmt = await self._prepared(conn, name)
+        if method == "execute":
+            await stmt.fetch(*args)
+            return stmt.get_statusmsg()
+        return await getattr(stmt, method)(*args)
+
+    async def _run(self, method, query, args, conn=None):
+        """クエリを実行し、統計を記録する (名前付きならPreparedStatementを使う)"""
+        started = time.perf_counter()
+        if conn is None:
+            async with self.pool.acquire() as conn:
+                acquired = time.perf_counter()
+                result = await self._execute_on(conn, method, query, args)
+        else:
+            # トランザクション中の接続 (プール待ちは無い)
+            acquired = started
+            result = await self._execute_on(conn, method, query, args)
+        finished = time.perf_counter()
+
+        named = query in QUERIES
+        key = query if named else " ".join(query.split())[:80]
+        stats = self.query_stats.get(key)
+        if stats is None:
+            stats = self.query_stats[key] = QueryStats()
+        stats.record(finished - acquired, acquired - started, _row_count(method, result))
+        return result
+
+    async def _execute_on(self, conn, method, query, args):
+        if query not in QUERIES:
+            return await getattr(conn, method)(query, *args)
+        try:
+            return await self._call_prepared(conn, method, query, args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # スキーマ変更でPreparedStatementが無効になった場合は作り直す
+            conn.prepared.pop(query, None)
+            return await self._call_prepared(conn, method, query, args)
+
+    @asynccontextmanager
+    async def transaction(self, isolation=None, readonly=False):
+        """1つの接続でトランザクションを張る (中のクエリも名前付きで呼べる)
+
+        async with db.transaction() as tx:
+            row = await tx.fetchrow("nations.get_for_update", user_id)
+        isolation は asyncpg と同じ ("repeatable_read" など)。
+        """
+        if not self.pool:
+            yield NullTransaction()
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(isolation=isolation, readonly=readonly):
+                yield Transaction(self, conn)
+
     async def execute(self, query, *args):
         if not self.pool: return
-        async with self.pool.acquire() as conn:
-            return await conn.execute(query, *args)
+        return await self._run("execute", query, args)
 
     async def fetch(self, query, *args):
         if not self.pool: return []
-        async with self.pool.acquire() as conn:
-            return await conn.fetch(query, *args)
+        return await self._run("fetch", query, args)
 
     async def fetchrow(self, query, *args):
         if not self.pool: return None
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow(query, *args)
-            
+        return await self._run("fetchrow", query, args)
+
     async def fetchval(self, query, *args):
         if not self.pool: return None
+        return await self._run("fetchval", query, args)
+
+    async def copy_records(self, table, records, columns):
+        """COPYで複数行をまとめて挿入する"""
+        if not self.pool: return
+        started = time.perf_counter()
         async with self.pool.acquire() as conn:
-            return await conn.fetchval(query, *args)
+            acquired = time.perf_counter()
+            await conn.copy_records_to_table(table, records=records, columns=columns)
+            finished = time.perf_counter()
+
+        key = f"copy:{table}"
+        stats = self.query_stats.get(key)
+        if stats is None:
+            stats = self.query_stats[key] = QueryStats()
+        stats.record(finished - acquired, acquired - started, len(records))
+
+    async def stream(self, query, *args, prefetch=1000):
+        """大きな結果をカーソルで少しずつ読む (名前付きクエリも可)"""
+        if not self.pool: return
+        sql = QUERIES.get(query, query)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(sql, *args, prefetch=prefetch):
+                    yield row
+
+    def slowest(self, limit=10, key="avg"):
+        """遅いクエリの一覧 (key: avg / max / total)"""
+        items = sorted(self.query_stats.items(), key=lambda kv: getattr(kv[1], key), reverse=True)
+        return items[:limit]
+
+    def get_stats(self):
+        calls = sum(s.calls for s in self.query_stats.values())
+        wait = sum(s.pool_wait for s in self.query_stats.values())
+        return {
+            "queries": len(self.query_stats),
+            "calls": calls,
+            "avg_pool_wait": f"{(wait / calls * 1000) if calls else 0:.2f}ms",
+            "pool_size": self.pool.get_size() if self.pool else 0,
+            "pool_idle": self.pool.get_idle_size() if self.pool else 0,
+        }
 
     async def close(self):
         if self.pool:
@@ -0,0 +1,96 @@
+import time
+
+class _UserWindow:
+    """1ユーザー分の直近メッセージ履歴 (固定長リングバッファ)"""
+    __slots__ = ("times", "hashes", "pos", "expires")
+
+    def __init__(self, size):
+        self.times = [float("-inf")] * size
+        self.hashes = [0] * size
+        self.pos = 0
+        self.expires = 0
+
+class FloodDetector:
+    """ギルド×ユーザー単位のスライディングウィンドウ連投検知
+
+    - 連投: 直近 rate_limit 件が rate_window 秒以内に収まっていたら違反
+    - 同一内容: dup_window 秒以内に同じ内容が dup_limit 回以上投稿されたら違反
+    各ユーザーの履歴は固定長なので1メッセージあたりO(1)、
+    発言が止まったユーザーはタイミングホイールで追い出す (全キーの走査はしない)。
+    """
+
+    def __init__(self, rate_limit=5, rate_window=5.0, dup_limit=3, dup_window=30.0,
+                 history=8, idle_timeout=120, resolution=10):
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.dup_limit = dup_limit
+        self.dup_window = dup_window
+        self.history = max(history, rate_limit, dup_limit)
+
+        self.windows = {} # (guild_id, user_id) -> _UserWindow
+        # タイミングホイール: resolution 秒ごとのスロットに失効予定のキーを入れる
+        self.resolution = resolution
+        self.idle_ticks = max(1, int(idle_timeout // resolution))
+        self.wheel = [set() for _ in range(self.idle_ticks + 1)]
+        self.tick = int(time.monotonic() // resolution)
+        self.evictions = 0
+
+    def _advance(self, now_tick):
+        """経過したスロットを処理し、期限切れのユーザーを追い出す"""
+        steps = min(now_tick - self.tick, len(self.wheel))
+        for i in range(1, steps + 1):
+            bucket = self.wheel[(self.tick + i) % len(self.wheel)]
+            for key in bucket:
+                window = self.windows.get(key)
+                # 途中で発言があれば別スロットに移っているので残す
+                if window is not None and window.expires <= now_tick:
+                    del self.windows[key]
+                    self.evictions += 1
+            bucket.clear()
+        self.tick = max(self.tick, now_tick)
+
+    def check(self, guild_id, user_id, content, now=None):
+        """メッセージを記録し、違反していれば理由を返す (問題なければNone)"""
+        now = time.monotonic() if now is None else now
+        now_tick = int(now // self.resolution)
+        if now_tick > self.tick:
+            self._advance(now_tick)
+
+        key = (guild_id, user_id)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = _UserWindow(self.history)
+
+        # 失効予定を更新 (スロットが変わるときだけホイールに登録し直す)
+        expires = now_tick + self.idle_ticks
+        if expires != window.expires:
+            window.expires = expires
+            self.wheel[expires % len(self.wheel)].add(key)
+
+        size = self.history
+        pos = window.pos
+        digest = hash(content)
+        window.times[pos] = now
+        window.hashes[pos] = digest
+        window.pos = (pos + 1) % size
+
+        # rate_limit 件前の投稿時刻と比較
+        oldest = window.times[(pos - self.rate_limit + 1) % size]
+        if now - oldest <= self.rate_window:
+            return "連投"
+
+        # 同一内容の回数 (履歴は固定長なのでO(1))
+        if content:
+            dup = 0
+            for t, h in zip(window.times, window.hashes):
+                if h == digest and now - t <= self.dup_window:
+                    dup += 1
+            if dup >= self.dup_limit:
+                return "同一内容の連投"
+        return None
+
+    def stats(self):
+        return {
+            "tracked_users": len(self.windows),
+            "evictions": self.evictions,
+        }
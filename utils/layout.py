@@ -0,0 +1,144 @@
+"""名言画像の文字組み (ピクセル幅での折り返し・禁則処理・自動縮小)
+
+文字幅はフォントサイズごとに配列 (コードポイント -> 幅) にキャッシュし、
+2回目以降は Pillow に問い合わせずに折り返し位置を決める。
+"""
+from array import array
+
+# 行頭に来てはいけない文字 (前の行の末尾にぶら下げる)
+NO_LINE_START = set("、。，．,.・：；:;？！?!゛゜ヽヾゝゞ々ー～）］｝」』〕〉》】〙〗)]}’”"
+                    "ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶ")
+# 行末に来てはいけない文字 (次の行の先頭に送る)
+NO_LINE_END = set("（［｛「『〔〈《【〘〖([{‘“")
+MAX_HANGING = 2 # 行末にぶら下げて幅からはみ出してよい文字数
+
+_UNKNOWN = 0xFFFF
+_SCALE = 16 # 幅は1/16px単位で保持する
+
+class GlyphWidths:
+    """1つのフォント (サイズ) の文字幅キャッシュ
+
+    BMPの文字は 65536 要素の符号なし16bit配列 (128KB) に、それ以外は辞書に入れる。
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.table = array("H", [_UNKNOWN]) * 65536
+        self.extra = {}
+
+    def width(self, ch):
+        code = ord(ch)
+        if code < 65536:
+            w = self.table[code]
+            if w == _UNKNOWN:
+                w = self.table[code] = min(int(round(self.font.getlength(ch) * _SCALE)), _UNKNOWN - 1)
+            return w
+        w = self.extra.get(code)
+        if w is None:
+            w = self.extra[code] = int(round(self.font.getlength(ch) * _SCALE))
+        return w
+
+    def measure(self, text):
+        """text の各文字の幅のリスト (キャッシュ済みならPythonのループを通さずに引く)"""
+        try:
+            widths = list(map(self.table.__getitem__, map(ord, text)))
+        except IndexError:
+            # BMP外の文字を含む
+            return [self.width(ch) for ch in text]
+        if _UNKNOWN in widths:
+            widths = [self.width(ch) for ch in text]
+        return widths
+
+def wrap(text, widths, max_width, measured=None):
+    """max_width (px) に収まるように折り返した行のリストを返す"""
+    limit = max_width * _SCALE
+    width_of = widths.width
+    measured = measured if measured is not None else widths.measure(text)
+    lines = []
+    pos = 0
+    for paragraph in text.split("\n"):
+        line = []
+        line_width = 0
+        hanging = 0 # 行末にぶら下げた文字数 (続く行頭禁則文字も MAX_HANGING までこの行に付ける)
+        for ch, w in zip(paragraph, measured[pos:pos + len(paragraph)]):
+            if hanging:
+                if ch in NO_LINE_START and hanging < MAX_HANGING:
+                    line.append(ch)
+                    hanging += 1
+                    continue
+                carry = []
+                if ch in NO_LINE_START:
+                    # ぶら下げきれない: ぶら下げた分を直前の文字ごと次の行へ送る
+                    # (「ーーー…」のように送っても収まらない連続は行頭に来るのを諦めて折り返す)
+                    i = len(line) - hanging - 1
+                    if i > 1 and line[i - 1] in NO_LINE_END:
+                        i -= 1 # 開き括弧も行末に残さない
+                    if i > 0 and line[i] not in NO_LINE_START:
+                        carry = line[i:]
+                        del line[i:]
+                lines.append("".join(line).rstrip(" "))
+                line, hanging = carry, 0
+                line_width = sum(width_of(c) for c in line)
+                if ch == " ":
+                    continue
+            if line and line_width + w > limit:
+                if ch in NO_LINE_START:
+                    # 行頭禁則: はみ出してもこの行の末尾にぶら下げる (「。」」のような連続は MAX_HANGING 文字まで)
+                    line.append(ch)
+                    hanging = 1
+                    continue
+                if ch == " ":
+                    # 空白で折り返す場合は空白を行頭にも行末にも残さない
+                    lines.append("".join(line).rstrip(" "))
+                    line, line_width = [], 0
+                    continue
+                carry = []
+                # 行末禁則: 開き括弧などは次の行へ送る
+                while line and line[-1] in NO_LINE_END and len(carry) < len(line) - 1:
+                    carry.insert(0, line.pop())
+                # 英単語の途中なら直前の空白で折り返す
+                if ch.isascii() and ch.isalnum() and line[-1].isascii() and line[-1].isalnum():
+                    for i in range(len(line) - 1, 0, -1):
+                        if line[i] == " ":
+                            carry = line[i + 1:] + carry
+                            del line[i:]
+                            break
+                lines.append("".join(line).rstrip(" "))
+                line = carry
+                line_width = sum(width_of(c) for c in line)
+            line.append(ch)
+            line_width += w
+        lines.append("".join(line))
+        pos += len(paragraph) + 1
+    return lines
+
+def fit_text(text, widths_for, max_width, max_height, sizes, line_spacing=1.25):
+    """大きいサイズから順に試し、収まった (サイズ, 行) を返す
+
+    widths_for(size) はそのサイズの GlyphWidths を返す関数。
+    最小サイズでも収まらない場合は入る行数で切り、末尾を「…」にする (「…」も max_width に収める)。
+    """
+    for size in sizes:
+        line_height = int(size * line_spacing)
+        max_lines = max(1, max_height // line_height)
+        widths = widths_for(size)
+        measured = widths.measure(text)
+        # 全体の幅から必要な行数を見積もり、明らかに入らないサイズは折り返さずに飛ばす
+        if size != sizes[-1] and sum(measured) > max_lines * max_width * _SCALE:
+            continue
+        lines = wrap(text, widths, max_width, measured)
+        if len(lines) <= max_lines or size == sizes[-1]:
+            break
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        # ぶら下げた文字があると最後の行ははみ出しうるので、「…」が幅に収まるまで末尾を削る
+        last = lines[-1]
+        last_widths = widths.measure(last)
+        room = max_width * _SCALE - widths.width("…")
+        total = sum(last_widths)
+        n = len(last)
+        while n and total > room:
+            n -= 1
+            total -= last_widths[n]
+        lines[-1] = last[:n].rstrip(" ") + "…"
+    return size, lines
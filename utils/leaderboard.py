@@ -0,0 +1,174 @@
+import logging
+import time
+from collections import defaultdict
+
+class TopK:
+    """上位K件のボード (K件より多めの候補を持ち、増減に差分で追従する)
+
+    候補に入っていないユーザーの値は必ず floor 以下になるように保つ。
+    K位が floor を下回った場合は正確な順位が分からないので top() は None を返す (要再構築)。
+    """
+    __slots__ = ("k", "capacity", "scores", "floor")
+
+    def __init__(self, k=10, capacity=None):
+        self.k = k
+        self.capacity = capacity or k * 5
+        self.scores = {}  # user_id -> 総資産 (候補のみ)
+        self.floor = None # 候補外の最大値の上限 (None = 候補外にユーザーはいない)
+
+    def update(self, user_id, score):
+        if user_id in self.scores:
+            self.scores[user_id] = score
+        elif self.floor is None or score > self.floor:
+            self.scores[user_id] = score
+            if len(self.scores) > self.capacity:
+                # 最下位を候補から外す (外したユーザーの値が新しい floor)
+                lowest = min(self.scores, key=self.scores.__getitem__)
+                evicted = self.scores.pop(lowest)
+                self.floor = evicted if self.floor is None else max(self.floor, evicted)
+
+    def remove(self, user_id):
+        self.scores.pop(user_id, None)
+
+    def invalidate(self):
+        """次の top() でDBから取り直させる"""
+        self.scores = {}
+        self.floor = float("inf")
+
+    def load(self, rows, complete):
+        """DBから取り直した上位候補で置き換える (complete: 候補外にユーザーがいない)"""
+        self.scores = {user_id: score for user_id, score in rows}
+        self.floor = None if complete or not self.scores else min(self.scores.values())
+
+    def top(self):
+        items = sorted(self.scores.items(), key=lambda kv: kv[1], reverse=True)[:self.k]
+        if self.floor is not None and (len(items) < self.k or items[-1][1] < self.floor):
+            return None
+        return items
+
+class Leaderboard:
+    """総資産ランキング (全体 + ギルドごと) をメモリ上で差分更新する
+
+    起動時にusersテーブルを1回ストリーミングして構築し、以降は残高の変化
+    (Bank からの通知) とメンバーの参加・退出で更新する。
+    """
+
+    def __init__(self, db, k=10):
+        self.db = db
+        self.k = k
+        self.global_board = TopK(k)
+        self.guild_boards = {}                # guild_id -> TopK
+        self.member_guilds = defaultdict(set) # user_id -> 所属ギルドID
+        self.ready = False
+        self.rebuilds = 0
+        self.last_build_time = 0.0
+
+    async def build(self, guilds):
+        """メンバー情報とusersテーブルから全ボードを作り直す"""
+        started = time.perf_counter()
+        member_guilds = defaultdict(set)
+        for guild in guilds:
+            for member in guild.members:
+                if not member.bot:
+                    member_guilds[member.id].add(guild.id)
+
+        global_board = TopK(self.k)
+        guild_boards = {guild.id: TopK(self.k) for guild in guilds}
+        count = 0
+        async for row in self.db.stream("users.net_worth_all"):
+            global_board.update(row['id'], row['worth'])
+            for guild_id in member_guilds.get(row['id'], ()):
+                guild_boards[guild_id].update(row['id'], row['worth'])
+            count += 1
+
+        self.global_board = global_board
+        self.guild_boards = guild_boards
+        self.member_guilds = member_guilds
+        self.ready = True
+        self.last_build_time = time.perf_counter() - started
+        logging.info(f"🏆 ランキングを構築しました ({count}人, {self.last_build_time:.2f}秒)")
+
+    # --- 差分更新 ---
+    def on_balance(self, user_id, worth):
+        if not self.ready:
+            return
+        self.global_board.update(user_id, worth)
+        for guild_id in self.member_guilds.get(user_id, ()):
+            board = self.guild_boards.get(guild_id)
+            if board:
+                board.update(user_id, worth)
+
+    def add_member(self, guild_id, user_id, worth):
+        self.member_guilds[user_id].add(guild_id)
+        board = self.guild_boards.get(guild_id)
+        if board and worth is not None:
+            board.update(user_id, worth)
+
+    def remove_member(self, guild_id, user_id):
+        guilds = self.member_guilds.get(user_id)
+        if guilds:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self.member_guilds[user_id]
+        board = self.guild_boards.get(guild_id)
+        if board:
+            board.remove(user_id)
+
+    def add_guild(self, guild):
+        for member in guild.members:
+            if not member.bot:
+                self.member_guilds[member.id].add(guild.id)
+        board = self.guild_boards[guild.id] = TopK(self.k)
+        board.invalidate()
+
+    def remove_guild(self, guild_id):
+        self.guild_boards.pop(guild_id, None)
+        for guilds in self.member_guilds.values():
+            guilds.discard(guild_id)
+
+    def invalidate(self):
+        """usersを一括更新した後などに呼ぶ (全ボードを次回参照時にDBから取り直す)"""
+        self.global_board.invalidate()
+        for board in self.guild_boards.values():
+            board.invalidate()
+
+    # --- 参照 ---
+    async def _query(self, guild, limit):
+        if guild is None:
+            rows = await self.db.fetch("users.top_net_worth", limit)
+        else:
+            members = [m.id for m in guild.members if not m.bot]
+            rows = await self.db.fetch("users.top_net_worth_in", members, limit)
+        return [(row['id'], row['worth']) for row in rows]
+
+    async def top(self, guild=None):
+        """上位K件の (user_id, 総資産) リスト。guild を指定するとそのギルドのメンバーのみ"""
+        if not self.ready:
+            # 構築前はDBから直接取る
+            return await self._query(guild, self.k)
+
+        if guild is None:
+            board = self.global_board
+        else:
+            board = self.guild_boards.get(guild.id)
+            if board is None:
+                self.add_guild(guild)
+                board = self.guild_boards[guild.id]
+
+        items = board.top()
+        if items is None:
+            # 候補が足りなくなったボードだけDBから取り直す
+            self.rebuilds += 1
+            rows = await self._query(guild, board.capacity)
+            board.load(rows, complete=len(rows) < board.capacity)
+            items = board.top() or []
+        return items
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "guild_boards": len(self.guild_boards),
+            "tracked_members": len(self.member_guilds),
+            "rebuilds": self.rebuilds,
+            "build_time": f"{self.last_build_time:.2f}s",
+        }
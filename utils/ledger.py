@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import logging
+import time
+
+LEDGER_COLUMNS = ("user_id", "kind", "cash_delta", "bank_delta", "debt_delta", "counterparty", "created_at")
+
+class Ledger:
+    """経済の取引履歴 (追記のみ)
+
+    record() はメモリに貯めるだけで、interval 秒ごと・max_entries 件ごとに
+    COPY でまとめて economy_transactions に書き込む (コマンドごとの往復は増えない)。
+    古い履歴は compact() で economy_snapshots に畳み込んで削除するので、
+    ユーザーの残高は「スナップショット + 残っている履歴」で再構築できる (replay)。
+    終了時は close() で残りを書き込む。プロセスが落ちた場合は未書き込み分が失われる。
+    """
+
+    def __init__(self, db, interval=1.0, max_entries=1000):
+        self.db = db
+        self.interval = interval
+        self.max_entries = max_entries
+        self.pending = []
+        self.task = None
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+
+        # メトリクス
+        self.recorded = 0
+        self.flushes = 0
+        self.max_batch = 0
+        self.total_flush_time = 0.0
+        self.failures = 0
+        self.compacted = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    def record(self, user_id, kind, cash=0, bank=0, debt=0, counterparty=None):
+        self.pending.append((user_id, kind, cash, bank, debt, counterparty, datetime.datetime.now()))
+        self.recorded += 1
+        if len(self.pending) >= self.max_entries:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"❌ 取引履歴の書き込みに失敗しました: {e}")
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            started = time.perf_counter()
+            try:
+                await self.db.copy_records("economy_transactions", batch, LEDGER_COLUMNS)
+            except BaseException:
+                # 失敗・キャンセルされたら先頭に戻して次回に再試行 (順序は保つ)
+                self.pending[:0] = batch
+                self.failures += 1
+                raise
+            self.flushes += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            self.total_flush_time += time.perf_counter() - started
+
+    async def compact(self, keep_days=7, chunk_size=50_000):
+        """keep_days より古い履歴をスナップショットに畳み込んで削除する。(件数, チャンク数) を返す"""
+        await self.flush()
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+        upper = await self.db.fetchval("ledger.compact_upper", cutoff)
+        if upper is None:
+            return 0, 0
+        # id順に chunk_size ずつ畳み込む (各チャンクは1ステートメントなので途中で止まっても整合する)
+        lower = await self.db.fetchval("ledger.min_id") - 1
+        moved = chunks = 0
+        while lower < upper:
+            step = min(lower + chunk_size, upper)
+            moved += await self.db.fetchval("ledger.compact", lower, step)
+            lower = step
+            chunks += 1
+            await asyncio.sleep(0.05)
+        self.compacted += moved
+        return moved, chunks
+
+    async def replay(self, user_id=None):
+        """スナップショットと履歴から残高を再構築する ({user_id: [cash, bank, debt]})"""
+        await self.flush()
+        balances = {}
+        if not self.db.pool:
+            return balances
+        args = () if user_id is None else (user_id,)
+        suffix = "" if user_id is None else "_of"
+        # スナップショットと履歴は同じスナップショット (REPEATABLE READ) で読む。
+        # 別々に読むと間に compact() が入ったとき、畳み込まれた分がどちらにも数えられない
+        async with self.db.transaction(isolation="repeatable_read", readonly=True) as tx:
+            async for row in tx.stream("ledger.snapshots" + suffix, *args):
+                balances[row['user_id']] = [row['cash'], row['bank'], row['debt']]
+            async for row in tx.stream("ledger.entries" + suffix, *args):
+                balance = balances.setdefault(row['user_id'], [0, 0, 0])
+                balance[0] += row['cash_delta']
+                balance[1] += row['bank_delta']
+                balance[2] += row['debt_delta']
+        return balances
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "max_batch": self.max_batch,
+            "avg_flush": f"{(self.total_flush_time / self.flushes * 1000) if self.flushes else 0:.1f}ms",
+            "failures": self.failures,
+            "compacted": self.compacted,
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import datetime
+import logging
+import time
+
+# --- 経済の定期処理 ---
+# query は utils/database.py の名前付きクエリ。引数は (前回のID, 件数, *args(now)) で、
+# id順に chunk_size 件ずつ更新して (last_id, touched) を返す (1チャンク = 1ステートメントなのでロックは短い)。
+# args の最後は取引履歴の created_at (Ledger と同じくPython側の時刻にそろえる)。
+# handler を指定したジョブは Maintenance のそのメソッドを (job, now, 前回のID) で呼ぶ。
+MAINTENANCE_JOBS = {
+    "debt_interest": {
+        "desc": "借金の利息 (日利1%)",
+        "interval": 86400,
+        "query": "maintenance.debt_interest",
+        "args": lambda now: (0.01, now),
+    },
+    "bank_interest": {
+        "desc": "預金の利息 (日利0.1%)",
+        "interval": 86400,
+        "query": "maintenance.bank_interest",
+        "args": lambda now: (0.001, now),
+    },
+    "inactivity_decay": {
+        "desc": "30日以上活動の無いユーザーの現金減衰 (10万を超える分の1%)",
+        "interval": 86400,
+        "query": "maintenance.inactivity_decay",
+        "args": lambda now: (0.01, 100_000, now - datetime.timedelta(days=30), now),
+    },
+    "ledger_compaction": {
+        "desc": "7日より古い取引履歴をスナップショットに畳み込む",
+        "interval": 86400,
+        "handler": "_compact_ledger",
+    },
+}
+
+class Maintenance:
+    """経済の定期処理を実行するスケジューラ (setup_hook から start する)
+
+    最終実行時刻は maintenance_runs テーブルに記録するので、再起動しても二重に実行しない。
+    チャンクごとの途中経過 (実行開始時刻と最後のID) もチャンクと同じトランザクションで記録し、
+    途中で失敗したジョブは次回その続きから同じ開始時刻で再開する (更新済みのチャンクに二重に適用しない)。
+    usersを直接更新するので、実行中は Bank のキャッシュを止め、実行後はランキングを捨てる。
+    """
+
+    def __init__(self, db, bank, leaderboard, ledger, jobs=MAINTENANCE_JOBS, chunk_size=1000, pause=0.05):
+        self.db = db
+        self.bank = bank
+        self.leaderboard = leaderboard
+        self.ledger = ledger
+        self.jobs = jobs
+        self.chunk_size = chunk_size
+        self.pause = pause # チャンク間の待ち時間 (秒)
+        self.task = None
+        self.last_runs = {} # ジョブ名 -> 最終実行時刻
+        self.progress = {}  # ジョブ名 -> (実行開始時刻, 更新済みの最後のID) 途中で失敗したジョブ
+        self.results = {}   # ジョブ名 -> (更新件数, 所要時間, チャンク数)
+
+    def start(self):
+        if self.task is None and self.db.pool:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def _load_last_runs(self):
+        """最終実行時刻を読み込む (失敗したら少し待って再試行。読めないまま実行すると二重に処理してしまう)"""
+        while True:
+            try:
+                rows = await self.db.fetch("maintenance.runs")
+            except Exception as e:
+                logging.error(f"❌ 定期処理の実行履歴を読み込めませんでした (60秒後に再試行): {e}")
+                await asyncio.sleep(60)
+                continue
+            for row in rows:
+                self.last_runs[row['job']] = row['last_run']
+                if row['run_started'] is not None:
+                    self.progress[row['job']] = (row['run_started'], row['progress_id'])
+            return
+
+    async def _run(self):
+        await self._load_last_runs()
+
+        while True:
+            now = datetime.datetime.now()
+            next_due = now + datetime.timedelta(minutes=5)
+            for name, job in self.jobs.items():
+                last = self.last_runs.get(name)
+                due = last + datetime.timedelta(seconds=job['interval']) if last else now
+                if due <= now or name in self.progress:
+                    try:
+                        await self.run_job(name)
+                    except Exception as e:
+                        logging.error(f"❌ 定期処理 {name} に失敗しました: {e}")
+                    due = now + datetime.timedelta(seconds=job['interval'])
+                next_due = min(next_due, due)
+            await asyncio.sleep(max(1.0, (next_due - datetime.datetime.now()).total_seconds()))
+
+    async def run_job(self, name):
+        """ジョブを1回実行し、(更新件数, 所要時間) を返す (途中で失敗した回があればその続きから)"""
+        job = self.jobs[name]
+        now, last_id = self.progress.get(name, (datetime.datetime.now(), 0))
+        if last_id:
+            logging.info(f"🧾 定期処理 {job['desc']}: 前回の続き (ID {last_id} より後) から再開します")
+        started = time.perf_counter()
+        touched, chunks = await getattr(self, job.get('handler', '_update_users'))(name, job, now, last_id)
+        elapsed = time.perf_counter() - started
+        await self.db.execute("maintenance.record", name, now, touched, elapsed)
+        self.progress.pop(name, None)
+        self.last_runs[name] = now
+        self.results[name] = (touched, elapsed, chunks)
+        logging.info(f"🧾 定期処理 {job['desc']}: {touched}件更新 ({chunks}チャンク, {elapsed:.2f}秒)")
+        return touched, elapsed
+
+    async def _update_users(self, name, job, now, last_id):
+        """usersをid順にチャンクごとに更新する (last_id より後から)"""
+        # 未反映の入金を先に書き込んでから更新する
+        if self.bank.buffer:
+            await self.bank.buffer.flush()
+
+        args = job['args'](now)
+        touched = chunks = 0
+        # 実行中はキャッシュの行が更新前の残高のままになるので、Bank はキャッシュを使わずSQLで判定する
+        self.bank.suspend()
+        try:
+            while True:
+                # チャンクの更新と途中経過の記録を同じトランザクションで行う (どちらかだけ残ることはない)
+                async with self.db.transaction() as tx:
+                    row = await tx.fetchrow(job['query'], last_id, self.chunk_size, *args)
+                    if row is None or row['last_id'] is None:
+                        break
+                    await tx.execute("maintenance.progress", name, now, row['last_id'])
+                last_id = row['last_id']
+                self.progress[name] = (now, last_id)
+                touched += row['touched']
+                chunks += 1
+                await asyncio.sleep(self.pause)
+        finally:
+            # 途中で失敗しても更新済みのチャンクはあるのでキャッシュは捨てる
+            self.bank.resume()
+            self.leaderboard.invalidate()
+        return touched, chunks
+
+    async def _compact_ledger(self, name, job, now, last_id):
+        return await self.ledger.compact()
+
+    def stats(self):
+        stats = {}
+        for name in self.jobs:
+            last = self.last_runs.get(name)
+            result = self.results.get(name)
+            if result:
+                touched, elapsed, chunks = result
+                stats[name] = f"{touched}件 / {chunks}チャンク / {elapsed:.2f}s ({last:%m-%d %H:%M})"
+            else:
+                stats[name] = f"前回 {last:%m-%d %H:%M}" if last else "未実行"
+        return stats
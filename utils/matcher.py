@@ -0,0 +1,81 @@
+from collections import deque
+
+_NO_MATCH = float("inf")
+
+# これ未満のトリガー数では `in` のループの方が速い (benchmarks/bench_auto_response.py で計測: 交差は130〜150件)
+AUTOMATON_THRESHOLD = 150
+
+class TriggerMatcher:
+    """複数のトリガー文字列を1パスで検索するAho-Corasickオートマトン
+
+    match() は「パターンを順番に `in` で調べて最初にヒットしたもの」と同じ番号を返す。
+    トリガーが少ないうちはオートマトンを作らず、そのループをそのまま使う
+    (automaton=True/False で固定できる)。
+    """
+
+    def __init__(self, patterns, automaton=None):
+        patterns = list(patterns)
+        if automaton is None:
+            automaton = len(patterns) >= AUTOMATON_THRESHOLD
+        self.automaton = automaton
+        if not automaton:
+            self.patterns = [(index, pattern) for index, pattern in enumerate(patterns) if pattern is not None]
+            return
+
+        self.goto = [{}]        # ノード -> {文字: 次ノード}
+        self.fail = [0]         # 失敗リンク
+        self.best = [_NO_MATCH] # このノードで終わるパターンの最小番号 (失敗リンク先を含む)
+        self.always = _NO_MATCH # 空文字トリガーは常にヒットする
+
+        for index, pattern in enumerate(patterns):
+            if pattern is None:
+                continue
+            if pattern == "":
+                self.always = min(self.always, index)
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(_NO_MATCH)
+                node = nxt
+            if index < self.best[node]:
+                self.best[node] = index
+
+        # 幅優先で失敗リンクを張り、出力 (最小番号) を伝播させる
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.best[child] = min(self.best[child], self.best[self.fail[child]])
+                queue.append(child)
+
+    def match(self, text):
+        """最初にヒットするパターンの番号を返す (なければNone)"""
+        if not self.automaton:
+            for index, pattern in self.patterns:
+                if pattern in text:
+                    return index
+            return None
+
+        best = self.always
+        goto, fail, outputs = self.goto, self.fail, self.best
+        node = 0
+        for ch in text:
+            if best == 0:
+                break # これ以上優先度の高いパターンはない
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if outputs[node] < best:
+                best = outputs[node]
+        return None if best == _NO_MATCH else best
@@ -0,0 +1,195 @@
+import logging
+
+# --- スキーママイグレーション ---
+# (バージョン, 説明, SQLのリスト) を古い順に並べる。
+# 適用済みのバージョンは schema_version テーブルに記録され、起動時には未適用のものだけ実行する。
+# 既存のマイグレーションは書き換えず、変更は新しいバージョンとして末尾に追加すること。
+MIGRATIONS = [
+    (1, "初期テーブル作成", [
+        # ユーザーテーブル (経済機能用)
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGINT PRIMARY KEY,
+            cash BIGINT DEFAULT 0,
+            bank BIGINT DEFAULT 0,
+            debt BIGINT DEFAULT 0,
+            job_id TEXT DEFAULT 'ニート',
+            last_daily TIMESTAMP,
+            last_work TIMESTAMP,
+            xp BIGINT DEFAULT 0,
+            level INT DEFAULT 1,
+            bio TEXT DEFAULT 'プロフィールは未設定です。'
+        )
+        """,
+        # 既存DBへのパッチ (旧バージョンで作られたusersテーブル用)
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS debt BIGINT DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS xp BIGINT DEFAULT 0",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS level INT DEFAULT 1",
+        # サーバー設定テーブル
+        """
+        CREATE TABLE IF NOT EXISTS guilds (
+            id BIGINT PRIMARY KEY,
+            prefix TEXT DEFAULT '/',
+            log_channel BIGINT,
+            welcome_channel BIGINT,
+            automod_enabled BOOLEAN DEFAULT FALSE,
+            automod_level INT DEFAULT 1,
+            verify_role_id BIGINT
+        )
+        """,
+        # 自動応答テーブル
+        """
+        CREATE TABLE IF NOT EXISTS auto_responses (
+            id SERIAL PRIMARY KEY,
+            guild_id BIGINT,
+            trigger TEXT,
+            response TEXT,
+            reaction TEXT
+        )
+        """,
+        # 警告管理テーブル
+        """
+        CREATE TABLE IF NOT EXISTS warnings (
+            id SERIAL PRIMARY KEY,
+            guild_id BIGINT,
+            user_id BIGINT,
+            reason TEXT,
+            moderator_id BIGINT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # 国家戦略テーブル
+        """
+        CREATE TABLE IF NOT EXISTS nations (
+            user_id BIGINT PRIMARY KEY,
+            name TEXT,
+            population BIGINT DEFAULT 100,
+            resources BIGINT DEFAULT 1000,
+            army BIGINT DEFAULT 0,
+            tax_rate INT DEFAULT 10
+        )
+        """,
+        # おみくじ設定テーブル
+        """
+        CREATE TABLE IF NOT EXISTS omikuji_settings (
+            id SERIAL PRIMARY KEY,
+            guild_id BIGINT,
+            result_name TEXT,
+            description TEXT,
+            probability INT
+        )
+        """,
+        # 管理者ホワイトリスト
+        """
+        CREATE TABLE IF NOT EXISTS admin_whitelist (
+            user_id BIGINT PRIMARY KEY
+        )
+        """,
+    ]),
+    (2, "よく使うクエリ用のインデックス", [
+        "CREATE INDEX IF NOT EXISTS idx_auto_responses_guild ON auto_responses (guild_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_warnings_guild_user ON warnings (guild_id, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_omikuji_settings_guild ON omikuji_settings (guild_id)",
+        # /s ranking の ORDER BY (cash + bank) DESC 用の式インデックス
+        "CREATE INDEX IF NOT EXISTS idx_users_net_worth ON users ((cash + bank) DESC)",
+    ]),
+    (3, "国家の徴収クールダウン", [
+        "ALTER TABLE nations ADD COLUMN IF NOT EXISTS last_collect TIMESTAMP",
+    ]),
+    (4, "経済の定期処理の実行記録", [
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            job TEXT PRIMARY KEY,
+            last_run TIMESTAMP,
+            rows_touched BIGINT,
+            duration REAL
+        )
+        """,
+    ]),
+    (5, "経済の取引履歴とスナップショット", [
+        """
+        CREATE TABLE IF NOT EXISTS economy_transactions (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            kind TEXT NOT NULL,
+            cash_delta BIGINT DEFAULT 0,
+            bank_delta BIGINT DEFAULT 0,
+            debt_delta BIGINT DEFAULT 0,
+            counterparty BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_economy_transactions_user ON economy_transactions (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS idx_economy_transactions_created ON economy_transactions (created_at)",
+        """
+        CREATE TABLE IF NOT EXISTS economy_snapshots (
+            user_id BIGINT PRIMARY KEY,
+            cash BIGINT DEFAULT 0,
+            bank BIGINT DEFAULT 0,
+            debt BIGINT DEFAULT 0,
+            last_tx_id BIGINT DEFAULT 0,
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # 履歴が無い時点の残高を最初のスナップショットにする
+        """
+        INSERT INTO economy_snapshots (user_id, cash, bank, debt)
+        SELECT id, cash, bank, debt FROM users ON CONFLICT DO NOTHING
+        """,
+    ]),
+    (6, "国家の時間経過 (最終更新時刻と未徴収の税収)", [
+        "ALTER TABLE nations ADD COLUMN IF NOT EXISTS last_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        "ALTER TABLE nations ADD COLUMN IF NOT EXISTS treasury BIGINT DEFAULT 0",
+    ]),
+    (7, "/fake の Webhook キャッシュ", [
+        """
+        CREATE TABLE IF NOT EXISTS webhook_cache (
+            channel_id BIGINT PRIMARY KEY,
+            guild_id BIGINT,
+            webhook_id BIGINT NOT NULL,
+            token TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (8, "国家の last_update をDBの時刻で埋めない (Python側の時刻を入れる)", [
+        "ALTER TABLE nations ALTER COLUMN last_update DROP DEFAULT",
+    ]),
+    (9, "経済の定期処理の途中経過 (失敗したジョブを続きから再開する)", [
+        """
+        ALTER TABLE maintenance_runs
+            ADD COLUMN IF NOT EXISTS run_started TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS progress_id BIGINT
+        """,
+    ]),
+]
+
+async def migrate(conn):
+    """未適用のマイグレーションだけを順番に実行する (最新ならDDLは一切流さない)"""
+    exists = await conn.fetchval("SELECT to_regclass('schema_version') IS NOT NULL")
+    current = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version") if exists else 0
+
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    if not pending:
+        logging.info(f"✅ データベーススキーマは最新です (v{current})")
+        return
+
+    if not exists:
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    for version, description, statements in pending:
+        # 1バージョンずつトランザクションで適用 (途中で失敗したらそのバージョンは未適用のまま)
+        async with conn.transaction():
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES ($1, $2)",
+                version, description
+            )
+        logging.info(f"🛠️ マイグレーション v{version} を適用しました: {description}")
@@ -0,0 +1,49 @@
+"""国家の人口・資源・税収の時間経過 (閉じた式で計算する)
+
+人口はロジスティック成長 P(t) = K / (1 + A·e^(-rt)), A = (K - P0) / P0 。
+資源と税収は人口に比例して貯まるので、経過時間分を ∫P(s)ds (延べ人日) から一度に求める。
+    ∫0..t P(s)ds = (K / r)·ln((e^(rt) + A) / (1 + A))
+バックグラウンドで毎ティック更新する代わりに、読み書きの時に last_update からの経過分を計算する。
+関数は NumPy 配列も受け取れる (イベント処理で全国家をまとめて計算する)。
+"""
+import numpy as np
+
+CAPACITY = 1_000_000 # 人口の上限
+GROWTH_RATE = 0.1    # 税率0%のときの1日あたりの人口増加率 (税率が上がるほど鈍る)
+RESOURCE_RATE = 2    # 1人・1日あたりの資源
+TAX_SCALE = 10       # 1人・1日あたりの税収 (税率100%のとき)
+
+def growth_rate(tax_rate):
+    return GROWTH_RATE * (1 - np.asarray(tax_rate, dtype=float) / 100)
+
+def project(population, tax_rate, days):
+    """days 日後の人口と、その間の延べ人日を返す"""
+    p0 = np.clip(np.asarray(population, dtype=float), 1, CAPACITY)
+    t = np.maximum(np.asarray(days, dtype=float), 0)
+    r = growth_rate(tax_rate)
+    a = (CAPACITY - p0) / p0
+    rt = r * t
+
+    population = CAPACITY / (1 + a * np.exp(-rt))
+    # ln(e^rt + A) を桁あふれしないように計算する (A = 0 なら人口は上限のまま)
+    with np.errstate(divide="ignore"):
+        log_a = np.log(a)
+    safe_r = np.where(r > 0, r, 1)
+    person_days = np.where(
+        r > 0,
+        CAPACITY / safe_r * (np.logaddexp(rt, log_a) - np.log1p(a)),
+        p0 * t, # 税率100%なら人口は増えない
+    )
+    return population, person_days
+
+def accrue(row, now):
+    """nationsの行を now 時点まで進めた値 (人口・資源・未徴収の税収)"""
+    last = row['last_update'] or now
+    days = (now - last).total_seconds() / 86400
+    population, person_days = project(row['population'], row['tax_rate'], days)
+    return {
+        "population": int(round(float(population))),
+        "resources": row['resources'] + int(RESOURCE_RATE * person_days),
+        "treasury": row['treasury'] + int(person_days * row['tax_rate'] / 100 * TAX_SCALE),
+        "growth": float(growth_rate(row['tax_rate'])),
+    }
@@ -0,0 +1,127 @@
+"""全国家に一度にかかるイベント (疫病・好景気・戦争・移民) をNumPyでまとめて処理する
+
+nationsを全件ロックして列ごとの配列に読み込み、経過分を進めてからイベントを配列演算で適用し、
+unnest を使った1つのUPDATEで書き戻す (国家ごとにPythonでUPDATEしない)。
+"""
+import datetime
+import time
+
+import numpy as np
+
+from utils.nation import CAPACITY, RESOURCE_RATE, TAX_SCALE, project
+
+EVENT_NAMES = {
+    "plague": "🦠 疫病",
+    "boom": "📈 好景気",
+    "war": "⚔️ 戦争",
+    "migration": "🧳 移民",
+}
+
+def load_columns(rows, now):
+    """nationsの行を列ごとの配列にし、now 時点まで進める"""
+    cols = {
+        "user_id": np.fromiter((r['user_id'] for r in rows), dtype=np.int64, count=len(rows)),
+        "population": np.fromiter((r['population'] for r in rows), dtype=float, count=len(rows)),
+        "resources": np.fromiter((r['resources'] for r in rows), dtype=np.int64, count=len(rows)),
+        "army": np.fromiter((r['army'] for r in rows), dtype=np.int64, count=len(rows)),
+        "tax_rate": np.fromiter((r['tax_rate'] for r in rows), dtype=float, count=len(rows)),
+        "treasury": np.fromiter((r['treasury'] for r in rows), dtype=np.int64, count=len(rows)),
+    }
+    now_ts = now.timestamp()
+    last = np.fromiter(((r['last_update'] or now).timestamp() for r in rows), dtype=float, count=len(rows))
+    advance(cols, (now_ts - last) / 86400)
+    return cols
+
+def advance(cols, days):
+    """utils/nation.accrue と同じ計算を全国家分まとめて行う"""
+    population, person_days = project(cols["population"], cols["tax_rate"], days)
+    cols["population"] = np.round(population)
+    cols["resources"] = cols["resources"] + (RESOURCE_RATE * person_days).astype(np.int64)
+    cols["treasury"] = cols["treasury"] + (person_days * cols["tax_rate"] / 100 * TAX_SCALE).astype(np.int64)
+
+# --- イベント (cols を書き換えて結果の説明を返す) ---
+def plague(cols, rng):
+    """3割の国で人口が10〜30%減る"""
+    n = len(cols["population"])
+    hit = rng.random(n) < 0.3
+    loss = np.where(hit, np.floor(cols["population"] * rng.uniform(0.1, 0.3, n)), 0)
+    cols["population"] = cols["population"] - loss
+    return f"{int(hit.sum()):,}か国で合計 {int(loss.sum()):,}人 が亡くなりました"
+
+def boom(cols, rng):
+    """半数の国で資源が20〜50%増える"""
+    n = len(cols["resources"])
+    hit = rng.random(n) < 0.5
+    gain = np.where(hit, (cols["resources"] * rng.uniform(0.2, 0.5, n)).astype(np.int64), 0)
+    cols["resources"] = cols["resources"] + gain
+    return f"{int(hit.sum()):,}か国で資源が合計 {int(gain.sum()):,} 増えました"
+
+def war(cols, rng):
+    """ランダムに2国ずつ組ませ、軍備の比で勝敗を決める (敗者の資源の1割が勝者へ、双方の軍備が減る)"""
+    order = rng.permutation(len(cols["army"]))
+    if len(order) % 2:
+        order = order[:-1]
+    a, b = order[0::2], order[1::2]
+    army_a = cols["army"][a].astype(float) + 1
+    army_b = cols["army"][b].astype(float) + 1
+    a_wins = rng.random(len(a)) < army_a / (army_a + army_b)
+    winner = np.where(a_wins, a, b)
+    loser = np.where(a_wins, b, a)
+
+    loot = cols["resources"][loser] // 10
+    cols["resources"][loser] -= loot
+    cols["resources"][winner] += loot
+    for side in (a, b):
+        cols["army"][side] -= (cols["army"][side] * rng.uniform(0.05, 0.15, len(side))).astype(np.int64)
+    return f"{len(a):,}組が交戦し、資源が合計 {int(loot.sum()):,} 奪われました"
+
+def migration(cols, rng):
+    """平均より税率の高い国から低い国へ人口が移る (総人口は変わらない)"""
+    tax = cols["tax_rate"]
+    pop = cols["population"]
+    gap = tax - tax.mean()
+    # 税率差1%ごとに人口の0.5%が出ていく (最大20%)
+    leave = np.where(gap > 0, np.floor(pop * np.minimum(gap * 0.005, 0.2)), 0)
+    total = leave.sum()
+    weight = np.where(gap < 0, -gap * pop, 0)
+    if total <= 0 or weight.sum() <= 0:
+        return "移民は発生しませんでした"
+    arrive = np.floor(total * weight / weight.sum())
+    cols["population"] = pop - leave + arrive
+    return f"{int((leave > 0).sum()):,}か国から {int(total):,}人 が税率の低い国へ移りました"
+
+EVENTS = {
+    "plague": plague,
+    "boom": boom,
+    "war": war,
+    "migration": migration,
+}
+
+def apply_event(kind, cols, rng=None):
+    rng = rng or np.random.default_rng()
+    summary = EVENTS[kind](cols, rng)
+    cols["population"] = np.clip(cols["population"], 1, CAPACITY)
+    cols["resources"] = np.maximum(cols["resources"], 0)
+    cols["army"] = np.maximum(cols["army"], 0)
+    return summary
+
+async def run_event(db, kind, rng=None):
+    """全国家にイベントを適用する。(説明, 国家数, 所要時間) を返す"""
+    started = time.perf_counter()
+    now = datetime.datetime.now()
+    async with db.transaction() as tx:
+        rows = await tx.fetch("nations.all_for_update")
+        if not rows:
+            return "国家がありません", 0, time.perf_counter() - started
+        cols = load_columns(rows, now)
+        summary = apply_event(kind, cols, rng)
+        await tx.execute(
+            "nations.bulk_update",
+            cols["user_id"].tolist(),
+            cols["population"].astype(np.int64).tolist(),
+            cols["resources"].tolist(),
+            cols["army"].tolist(),
+            cols["treasury"].tolist(),
+            now,
+        )
+    return summary, len(rows), time.perf_counter() - started
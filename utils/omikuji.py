@@ -0,0 +1,133 @@
+"""おみくじの抽選表とラッキーパーソン候補
+
+ギルドごとの結果 (omikuji_settings) は重みからエイリアス表 (Walker / Vose のエイリアス法) を作って
+メモリに置き、1回の抽選を乱数2つのO(1)で行う。表は初回の /omikuji play で作り、/omikuji add で捨てる。
+ラッキーパーソンはメンバーキャッシュ全体ではなく、ギルドごとに最近発言した人 (上限付き) から選ぶ。
+"""
+import asyncio
+import random
+from collections import OrderedDict
+
+from utils.cache import LRUCache
+
+DEFAULT_RESULTS = [
+    ("大吉", "最高の1日になるでしょう！"),
+    ("中吉", "いいことあるかも。"),
+    ("吉", "普通が一番。"),
+    ("凶", "足元に気をつけて。"),
+    ("大凶", "家にいよう。"),
+]
+
+class AliasTable:
+    """重み付き抽選表 (作成O(n)、抽選O(1))"""
+    __slots__ = ("items", "prob", "alias")
+
+    def __init__(self, items, weights):
+        n = len(items)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.items = list(items)
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            # s の枠の足りない分を l で埋める
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        # 残りは誤差で1付近になったものなので確率1のまま
+
+    def draw(self, rng=random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+    def __len__(self):
+        return len(self.items)
+
+DEFAULT_TABLE = AliasTable(DEFAULT_RESULTS, [1] * len(DEFAULT_RESULTS))
+
+class OmikujiTables:
+    """ギルドごとの抽選表のキャッシュ (カスタム結果が無い・重みが0のギルドはデフォルト表)"""
+
+    def __init__(self, db, maxsize=5000):
+        self.db = db
+        self.tables = LRUCache(maxsize=maxsize)
+        self._loading = {} # guild_id -> 読み込み中のTask (同時の初回抽選は1回の読み込みにまとめる)
+        self._stale = set() # 読み込み中に /omikuji add などがあったギルド (その読み込み結果はキャッシュしない)
+        self.builds = 0
+
+    async def get(self, guild_id):
+        table = self.tables.get(guild_id)
+        if table is None:
+            task = self._loading.get(guild_id)
+            if task is None:
+                task = self._loading[guild_id] = asyncio.create_task(self._load(guild_id))
+            table = await task
+        return table
+
+    async def _load(self, guild_id):
+        try:
+            rows = await self.db.fetch("omikuji.by_guild", guild_id)
+            rows = [row for row in rows if row['probability'] > 0]
+            if rows:
+                table = AliasTable(
+                    [(row['result_name'], row['description']) for row in rows],
+                    [row['probability'] for row in rows],
+                )
+            else:
+                table = DEFAULT_TABLE
+            self.builds += 1
+            if guild_id in self._stale:
+                # 読み込み中に変更された: 古いかもしれないので今回だけ使い、次の抽選で読み直す
+                self._stale.discard(guild_id)
+            else:
+                self.tables.set(guild_id, table)
+            return table
+        finally:
+            self._loading.pop(guild_id, None)
+
+    def invalidate(self, guild_id):
+        self.tables.pop(guild_id)
+        if guild_id in self._loading:
+            self._stale.add(guild_id)
+
+    def stats(self):
+        return {"builds": self.builds, **self.tables.stats()}
+
+class RecentMembers:
+    """ギルドごとの最近発言したユーザー (最大 size 人、古い順に押し出す)"""
+
+    def __init__(self, size=200):
+        self.size = size
+        self.guilds = {} # guild_id -> OrderedDict(user_id -> None)
+
+    def touch(self, guild_id, user_id):
+        recent = self.guilds.get(guild_id)
+        if recent is None:
+            recent = self.guilds[guild_id] = OrderedDict()
+        recent[user_id] = None
+        recent.move_to_end(user_id)
+        if len(recent) > self.size:
+            recent.popitem(last=False)
+
+    def remove(self, guild_id, user_id):
+        recent = self.guilds.get(guild_id)
+        if recent is not None:
+            recent.pop(user_id, None)
+
+    def remove_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    def pick(self, guild_id, rng=random):
+        """最近発言した人から1人選ぶ (誰もいなければ None)"""
+        recent = self.guilds.get(guild_id)
+        if not recent:
+            return None
+        return rng.choice(tuple(recent))
+
+    def stats(self):
+        return {"guilds": len(self.guilds), "members": sum(len(r) for r in self.guilds.values())}
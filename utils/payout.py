@@ -0,0 +1,143 @@
+"""スロット・エメラルドの払い戻し設定と、NumPyによるモンテカルロ分析
+
+ゲームの判定 (slot_multiplier など) は Cog とシミュレーターで同じものを使う。
+倍率は「賭け金1あたりの純増減」(負けは -1)。RTP = 1 + 期待値。
+設定を変えるときは先に分析して確認する:
+    python -m utils.payout
+"""
+import itertools
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+class SlotConfig(NamedTuple):
+    symbols: tuple
+    jackpot: int         # 大当たりの絵柄 (symbols のインデックス)
+    jackpot_mult: float  # 大当たり (3つ揃い)
+    triple_mult: float   # その他の3つ揃い
+    pair_mult: float     # 2つ揃い
+
+class EmeraldConfig(NamedTuple):
+    win_prob: float
+    win_mult: float
+
+SLOT = SlotConfig(symbols=("🍒", "🍋", "🍇", "🍉", "7️⃣"), jackpot=4,
+                  jackpot_mult=10, triple_mult=3, pair_mult=1.5)
+EMERALD = EmeraldConfig(win_prob=0.5, win_mult=1)
+
+# --- ゲームの判定 (Cogから使う) ---
+def slot_multiplier(config, reels):
+    """3つのリール (絵柄のインデックス) の倍率。ハズレは0"""
+    a, b, c = reels
+    if a == b == c:
+        return config.jackpot_mult if a == config.jackpot else config.triple_mult
+    if a == b or b == c or a == c:
+        return config.pair_mult
+    return 0
+
+# --- 理論値 ---
+def exact_slot(config):
+    """全組み合わせを数え上げた期待値と分散 (賭け金1あたり)"""
+    n = len(config.symbols)
+    nets = [slot_multiplier(config, reels) or -1 for reels in itertools.product(range(n), repeat=3)]
+    mean = sum(nets) / len(nets)
+    var = sum((x - mean) ** 2 for x in nets) / len(nets)
+    return mean, var
+
+def exact_emerald(config):
+    p = config.win_prob
+    mean = p * config.win_mult - (1 - p)
+    var = p * (config.win_mult - mean) ** 2 + (1 - p) * (-1 - mean) ** 2
+    return mean, var
+
+# --- ベクトル化したシミュレーション ---
+def _slot_nets(config, rng, n):
+    reels = rng.integers(0, len(config.symbols), size=(n, 3), dtype=np.int8)
+    a, b, c = reels[:, 0], reels[:, 1], reels[:, 2]
+    triple = (a == b) & (b == c)
+    pair = ~triple & ((a == b) | (b == c) | (a == c))
+    nets = np.full(n, -1.0)
+    nets[pair] = config.pair_mult
+    nets[triple] = config.triple_mult
+    nets[triple & (a == config.jackpot)] = config.jackpot_mult
+    return nets
+
+def _emerald_nets(config, rng, n):
+    return np.where(rng.random(n) < config.win_prob, float(config.win_mult), -1.0)
+
+def _nets(config, rng, n):
+    if isinstance(config, SlotConfig):
+        return _slot_nets(config, rng, n)
+    return _emerald_nets(config, rng, n)
+
+def _exact(config):
+    if isinstance(config, SlotConfig):
+        return exact_slot(config)
+    return exact_emerald(config)
+
+def simulate(config, spins=10_000_000, batch=1_000_000, seed=0):
+    """spins 回分の純増減を batch 件ずつ配列で生成し、平均・分散・当たり率を求める"""
+    rng = np.random.default_rng(seed)
+    total = total_sq = 0.0
+    wins = 0
+    done = 0
+    while done < spins:
+        n = min(batch, spins - done)
+        nets = _nets(config, rng, n)
+        total += nets.sum()
+        total_sq += np.square(nets).sum()
+        wins += int(np.count_nonzero(nets > 0))
+        done += n
+    mean = total / spins
+    return {
+        "spins": spins,
+        "mean": mean,
+        "variance": total_sq / spins - mean ** 2,
+        "hit_rate": wins / spins,
+    }
+
+def ruin_curve(config, bankroll=20, players=10_000, rounds=1_000, chunk=100,
+               checkpoints=(10, 50, 100, 500, 1_000), seed=1):
+    """所持金 bankroll (賭け金の倍数) から毎回同額を賭け続けたとき、
+    各ラウンド数までに賭け金を払えなくなったプレイヤーの割合"""
+    rng = np.random.default_rng(seed)
+    balance = np.full(players, float(bankroll))
+    ruined_at = np.full(players, rounds + 1)
+    alive = np.ones(players, dtype=bool)
+    for start in range(0, rounds, chunk):
+        n = min(chunk, rounds - start)
+        paths = balance[:, None] + np.cumsum(_nets(config, rng, players * n).reshape(players, n), axis=1)
+        hit = paths < 1
+        busted = alive & hit.any(axis=1)
+        ruined_at[busted] = start + hit[busted].argmax(axis=1) + 1
+        alive &= ~busted
+        balance = paths[:, -1]
+    return [(c, float(np.mean(ruined_at <= c))) for c in checkpoints if c <= rounds]
+
+@lru_cache(maxsize=None)
+def analyze(config, spins=10_000_000, bankroll=20):
+    """設定ごとの分析結果 (同じ設定は再計算しない)"""
+    mean, var = _exact(config)
+    sim = simulate(config, spins)
+    return {
+        "rtp": 1 + sim["mean"],
+        "exact_rtp": 1 + mean,
+        "stdev": sim["variance"] ** 0.5,
+        "exact_stdev": var ** 0.5,
+        "hit_rate": sim["hit_rate"],
+        "spins": spins,
+        "bankroll": bankroll,
+        "ruin": ruin_curve(config, bankroll),
+    }
+
+def format_report(report):
+    ruin = ", ".join(f"{rounds}回: {ratio:.1%}" for rounds, ratio in report["ruin"])
+    return (f"RTP {report['rtp']:.2%} (理論値 {report['exact_rtp']:.2%}) | "
+            f"標準偏差 {report['stdev']:.3f} | 当たり率 {report['hit_rate']:.1%}\n"
+            f"破産率 (所持金=賭け金x{report['bankroll']}): {ruin}")
+
+if __name__ == "__main__":
+    for name, config in (("スロット", SLOT), ("エメラルド", EMERALD)):
+        print(f"[{name}]")
+        print(format_report(analyze(config)))
@@ -0,0 +1,74 @@
+"""名言風画像 (/makeitquote) の描画
+
+RenderService のワーカープロセスで実行されるので、引数と戻り値はバイト列・文字列 (と Encoded) だけにする。
+フォントとマスクはワーカーごとに一度だけ作って使い回す。
+"""
+import io
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.encode import AUTO, encode
+from utils.layout import GlyphWidths, fit_text
+
+WIDTH, HEIGHT = 1200, 400
+BG_COLOR = (20, 20, 20) # Discord Darker
+FONT_PATH = "fonts/NotoSansJP-Bold.ttf"
+AVATAR_SIZE = 300
+AVATAR_FETCH_SIZE = 512 # CDNに要求するサイズ (2のべき乗で AVATAR_SIZE 以上)
+
+# 本文の領域 (アバターの右側・名前の下)。収まらなければ文字を小さくする
+TEXT_X, TEXT_Y = 380, 100
+TEXT_WIDTH = WIDTH - TEXT_X - 40
+TEXT_HEIGHT = HEIGHT - TEXT_Y - 50
+TEXT_SIZES = (50, 44, 38, 32, 28, 24, 20)
+LINE_SPACING = 1.25
+
+@lru_cache(maxsize=None)
+def font(size):
+    # フォント読み込み (fontsフォルダから。なければデフォルト)
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size) # Pillow 10.1以降はサイズ指定できる
+        except TypeError:
+            return ImageFont.load_default()
+
+@lru_cache(maxsize=None)
+def circle_mask(size):
+    # 丸く切り抜くためのマスク
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    return mask
+
+@lru_cache(maxsize=None)
+def glyph_widths(size):
+    return GlyphWidths(font(size))
+
+def render_quote(avatar_bytes, text, name, modes=AUTO):
+    """アバター画像のバイト列と本文から画像を作り、modes の中で一番小さい形式の Encoded を返す"""
+    name_font, logo_font = font(40), font(20)
+
+    img = Image.new('RGB', (WIDTH, HEIGHT), color=BG_COLOR)
+    draw = ImageDraw.Draw(img)
+
+    avatar_img = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
+    if avatar_img.size != (AVATAR_SIZE, AVATAR_SIZE):
+        avatar_img = avatar_img.resize((AVATAR_SIZE, AVATAR_SIZE))
+
+    # 丸く切り抜いて貼り付け
+    img.paste(avatar_img, (50, 50), circle_mask(AVATAR_SIZE))
+
+    # テキスト描画 (幅で折り返し、収まるサイズまで縮小)
+    size, lines = fit_text(text, glyph_widths, TEXT_WIDTH, TEXT_HEIGHT, TEXT_SIZES, LINE_SPACING)
+    text_font = font(size)
+    line_height = int(size * LINE_SPACING)
+    for i, line in enumerate(lines):
+        draw.text((TEXT_X, TEXT_Y + i * line_height), line, font=text_font, fill=(255, 255, 255))
+    draw.text((TEXT_X, 50), f"- {name}", font=name_font, fill=(150, 150, 150))
+
+    # ロゴ (右下)
+    draw.text((WIDTH - 150, HEIGHT - 40), "Rumia Bot", font=logo_font, fill=(100, 100, 100))
+
+    return encode(img, modes)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class RenderBusy(Exception):
+    """描画待ちが上限に達している (呼び出し側は「混雑中」と返す)"""
+
+def _timed(fn, args):
+    # ワーカープロセス側で実行時間を測る (プロセス間の受け渡し時間は含めない)
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+class RenderService:
+    """画像の描画をプロセスプールで行うサービス (イベントループを止めない)
+
+    同時に描画するのは workers 件まで。待ちを含めて max_queue 件を超えたら RenderBusy を投げて断る。
+    fn はワーカーから import できるモジュールレベルの関数にすること (spawn で起動するため)。
+    """
+
+    def __init__(self, workers=2, max_queue=32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = None
+        self.slots = asyncio.Semaphore(workers)
+        self.pending = 0 # 待ち + 描画中
+
+        # メトリクス
+        self.completed = 0
+        self.rejected = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_render = 0.0
+        self.max_render = 0.0
+        self.max_depth = 0
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def render(self, fn, *args):
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise RenderBusy()
+        self.start()
+        self.pending += 1
+        self.max_depth = max(self.max_depth, self.pending)
+        queued = time.perf_counter()
+        try:
+            async with self.slots:
+                wait = time.perf_counter() - queued
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                loop = asyncio.get_running_loop()
+                try:
+                    result, elapsed = await loop.run_in_executor(self.executor, _timed, fn, args)
+                except BrokenProcessPool:
+                    # ワーカーが落ちたプールは使えないので次回作り直す
+                    logging.error("❌ 描画プロセスが異常終了しました。プールを作り直します。")
+                    self.failures += 1
+                    self.close()
+                    raise
+                except Exception:
+                    self.failures += 1
+                    raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self.total_render += elapsed
+        self.max_render = max(self.max_render, elapsed)
+        return result
+
+    def stats(self):
+        done = self.completed + self.failures
+        return {
+            "workers": self.workers,
+            "pending": f"{self.pending}/{self.max_queue}",
+            "max_depth": self.max_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "avg_wait": f"{(self.total_wait / done * 1000) if done else 0:.1f}ms",
+            "max_wait": f"{self.max_wait * 1000:.1f}ms",
+            "avg_render": f"{(self.total_render / self.completed * 1000) if self.completed else 0:.1f}ms",
+            "max_render": f"{self.max_render * 1000:.1f}ms",
+        }
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from utils.cache import LRUCache
+
+# guildsテーブルのカラム (update_guildで更新できるもの)
+GUILD_FIELDS = ("prefix", "log_channel", "welcome_channel", "automod_enabled", "automod_level", "verify_role_id")
+
+class GuildSettings:
+    """guildsテーブル1行分の設定 (行が無いギルドはデフォルト値で exists=False)"""
+    __slots__ = ("guild_id", "exists", "loaded_at") + GUILD_FIELDS
+
+    def __init__(self, guild_id, row=None):
+        self.guild_id = guild_id
+        self.exists = row is not None
+        self.loaded_at = time.monotonic()
+        self.prefix = row['prefix'] if row else '/'
+        self.log_channel = row['log_channel'] if row else None
+        self.welcome_channel = row['welcome_channel'] if row else None
+        self.automod_enabled = row['automod_enabled'] if row else False
+        self.automod_level = row['automod_level'] if row else 1
+        self.verify_role_id = row['verify_role_id'] if row else None
+
+class SettingsStore:
+    """ホワイトリストとギルド設定のキャッシュ層 (書き込みはDBとキャッシュを同時に更新)
+
+    ホワイトリストは起動時に全件メモリに載せ、ギルド設定は初回アクセス時に読み込む。
+    TTLを過ぎた設定は古い値を返しつつバックグラウンドで読み直すため、
+    初回以降のモデレーション判定はDBを待たない。
+    """
+
+    def __init__(self, db, ttl=300, maxsize=5000):
+        self.db = db
+        self.ttl = ttl
+        self.whitelist = set()
+        self.guilds = LRUCache(maxsize=maxsize)
+        self._refreshing = {} # guild_id -> 読み込み中のTask (同時読み込みをまとめる)
+        self._stale = set() # 読み込み中に update_guild されたギルド (その読み込み結果は捨てる)
+
+    async def load(self):
+        """ホワイトリストを全件読み込む (起動時に1回)"""
+        rows = await self.db.fetch("whitelist.all")
+        self.whitelist = {row['user_id'] for row in rows}
+        logging.info(f"📋 ホワイトリストを読み込みました ({len(self.whitelist)}件)")
+
+    # --- ホワイトリスト ---
+    def is_whitelisted(self, user_id):
+        return user_id in self.whitelist
+
+    async def add_whitelist(self, user_id):
+        await self.db.execute("whitelist.add", user_id)
+        self.whitelist.add(user_id)
+
+    # --- ギルド設定 ---
+    async def _load_guild(self, guild_id):
+        try:
+            row = await self.db.fetchrow("guilds.get", guild_id)
+            settings = GuildSettings(guild_id, row)
+            if guild_id in self._stale:
+                # 読み込み中に更新された: 古い行で上書きせず、update_guild が入れた値を返す
+                self._stale.discard(guild_id)
+                return self.guilds.peek(guild_id) or settings
+            self.guilds.set(guild_id, settings)
+            return settings
+        finally:
+            self._refreshing.pop(guild_id, None)
+
+    def _start_load(self, guild_id):
+        task = self._refreshing.get(guild_id)
+        if task is None:
+            task = self._refreshing[guild_id] = asyncio.create_task(self._load_guild(guild_id))
+        return task
+
+    async def get_guild(self, guild_id):
+        settings = self.guilds.get(guild_id)
+        if settings is None:
+            return await self._start_load(guild_id)
+        if time.monotonic() - settings.loaded_at > self.ttl:
+            # 期限切れ: 古い値を返して裏で読み直す
+            self._start_load(guild_id)
+        return settings
+
+    async def update_guild(self, guild_id, **fields):
+        """ギルド設定を更新 (行が無ければ作成) してキャッシュにも反映する"""
+        columns = [c for c in fields if c in GUILD_FIELDS]
+        if len(columns) != len(fields):
+            raise ValueError(f"unknown guild settings: {set(fields) - set(GUILD_FIELDS)}")
+        values = [fields[c] for c in columns]
+        placeholders = ", ".join(f"${i}" for i in range(2, len(columns) + 2))
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+        row = await self.db.fetchrow(
+            f"INSERT INTO guilds (id, {', '.join(columns)}) VALUES ($1, {placeholders}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates} RETURNING *",
+            guild_id, *values
+        )
+        settings = GuildSettings(guild_id, row)
+        self.guilds.set(guild_id, settings)
+        if guild_id in self._refreshing:
+            self._stale.add(guild_id)
+        return settings
+
+    def stats(self):
+        return {"whitelist": len(self.whitelist), **self.guilds.stats()}
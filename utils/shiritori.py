@@ -0,0 +1,169 @@
+"""しりとりの単語辞書とゲーム判定
+
+単語リスト (data/shiritori_words.txt) を頭文字ごとに並べたバイナリ索引 (data/shiritori.idx) にして
+mmap で読む。メモリに載るのは頭文字の表だけで、単語本体はページキャッシュ上から必要な分だけ読む。
+索引はテキストより古ければ起動時に作り直す:
+    python -m utils.shiritori
+
+索引の形式 (リトルエンディアン):
+    b"SRT1", 頭文字の数 (u32), 単語数 (u32)
+    頭文字の表: (文字コード u32, 先頭の番号 u32, 個数 u32) × 頭文字の数
+    単語のオフセット: u32 × (単語数 + 1)
+    単語本体: UTF-8 を連結したもの
+"""
+import mmap
+import os
+import random
+import struct
+from array import array
+
+WORDS_PATH = "data/shiritori_words.txt"
+INDEX_PATH = "data/shiritori.idx"
+MAGIC = b"SRT1"
+
+SMALL_KANA = str.maketrans("ぁぃぅぇぉっゃゅょゎ", "あいうえおつやゆよわ")
+KANA_VOWELS = {} # 長音 (ー) の前の文字 -> 母音
+for vowel, row in zip("あいうえお", ("あかさたなはまやらわがざだばぱ", "いきしちにひみりぎじぢびぴ",
+                                      "うくすつぬふむゆるぐずづぶぷ", "えけせてねへめれげぜでべぺ",
+                                      "おこそとのほもよろをごぞどぼぽ")):
+    for kana in row:
+        KANA_VOWELS[kana] = vowel
+
+def normalize(text):
+    """カタカナをひらがなにし、前後の空白を除く (かな以外が含まれていれば None)"""
+    word = "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text.strip())
+    if not word or not all("ぁ" <= c <= "ゖ" or c == "ー" for c in word) or word[0] == "ー":
+        return None
+    return word
+
+def first_kana(word):
+    return word[0].translate(SMALL_KANA)
+
+def next_kana(word):
+    """語尾から次の頭文字を決める (小さい文字は大きく、「ー」で終わる場合は前の文字の母音)"""
+    if word.endswith("ー"):
+        stripped = word.rstrip("ー")
+        return KANA_VOWELS.get(stripped[-1].translate(SMALL_KANA), stripped[-1]) if stripped else None
+    return word[-1].translate(SMALL_KANA)
+
+# --- 索引の作成・読み込み ---
+def compile_index(words_path=WORDS_PATH, index_path=INDEX_PATH):
+    """単語リストから索引を作る。「ん」で終わる語は Bot が使えないので入れない"""
+    words = set()
+    with open(words_path, encoding="utf-8") as f:
+        for line in f:
+            word = normalize(line.split("#", 1)[0])
+            if word and len(word) >= 2 and next_kana(word) != "ん":
+                words.add(word)
+    ordered = sorted(words, key=lambda w: (first_kana(w), w))
+
+    table = []
+    offsets = array("I", [0])
+    blob = bytearray()
+    for i, word in enumerate(ordered):
+        head = first_kana(word)
+        if not table or table[-1][0] != ord(head):
+            table.append([ord(head), i, 0])
+        table[-1][2] += 1
+        blob += word.encode("utf-8")
+        offsets.append(len(blob))
+
+    tmp = index_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<II", len(table), len(ordered)))
+        for entry in table:
+            f.write(struct.pack("<III", *entry))
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp, index_path)
+    return len(ordered)
+
+class WordStore:
+    """mmap した索引から頭文字ごとに単語を引く"""
+
+    def __init__(self, index_path=INDEX_PATH, words_path=WORDS_PATH):
+        if not os.path.exists(index_path) or (
+            os.path.exists(words_path) and os.path.getmtime(words_path) > os.path.getmtime(index_path)
+        ):
+            compile_index(words_path, index_path)
+
+        with open(index_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:4] != MAGIC:
+            raise ValueError(f"しりとり索引の形式が不正です: {index_path}")
+        heads, self.count = struct.unpack_from("<II", self.map, 4)
+
+        self.heads = {} # 頭文字 -> (先頭の番号, 個数)
+        pos = 12
+        for _ in range(heads):
+            code, start, n = struct.unpack_from("<III", self.map, pos)
+            self.heads[chr(code)] = (start, n)
+            pos += 12
+        self.offsets = memoryview(self.map)[pos:pos + (self.count + 1) * 4].cast("I")
+        self.blob_start = pos + (self.count + 1) * 4
+
+    def word(self, i):
+        start = self.blob_start + self.offsets[i]
+        end = self.blob_start + self.offsets[i + 1]
+        return self.map[start:end].decode("utf-8")
+
+    def pick(self, head, used):
+        """head で始まる未使用の単語をランダムに1つ選ぶ (無ければ None)"""
+        start, n = self.heads.get(head, (0, 0))
+        if not n:
+            return None
+        # ランダムな位置から一周だけ探す
+        offset = random.randrange(n)
+        for k in range(n):
+            word = self.word(start + (offset + k) % n)
+            if word not in used:
+                return word
+        return None
+
+    def random_word(self):
+        return self.word(random.randrange(self.count))
+
+    def stats(self):
+        return {"words": self.count, "heads": len(self.heads), "index": f"{len(self.map) / 1024:.1f}KB"}
+
+# --- 対戦 ---
+class ShiritoriSession:
+    """1人分の対戦状態 (判定は頭文字・語尾・使用済みの集合を見るだけ)"""
+    __slots__ = ("channel", "user_id", "next", "used", "turns", "timer")
+
+    def __init__(self, channel, user_id, first_word):
+        self.channel = channel
+        self.user_id = user_id
+        self.next = next_kana(first_word)
+        self.used = {first_word}
+        self.turns = 0
+        self.timer = None
+
+    def check(self, word):
+        """プレイヤーの単語を判定する。問題なければ None、だめなら (理由, 負けかどうか)
+
+        辞書はBotの返答用で語彙が少ないので、プレイヤーの単語が辞書に無くても受け付ける。
+        """
+        if len(word) < 2:
+            return "2文字以上の言葉を入力してね", False
+        if first_kana(word) != self.next:
+            return f"「{self.next}」から始まる言葉を入力してね", False
+        if next_kana(word) == "ん":
+            return f"「{word}」は「ん」で終わっています", True
+        if word in self.used:
+            return f"「{word}」はもう使われています", True
+        self.used.add(word)
+        self.turns += 1
+        return None
+
+    def play(self, store, word):
+        """Botの返答を選んで状態を進める (返せなければ None = Botの負け)"""
+        reply = store.pick(next_kana(word), self.used)
+        if reply is None:
+            return None
+        self.used.add(reply)
+        self.next = next_kana(reply)
+        return reply
+
+if __name__ == "__main__":
+    print(f"{compile_index()} 語の索引を作成しました: {INDEX_PATH}")
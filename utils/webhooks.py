@@ -0,0 +1,81 @@
+"""/fake で使う Webhook のチャンネルごとのキャッシュ
+
+channel.webhooks() は毎回 REST を呼ぶうえ Manage Webhooks 権限が必要で、連投するとレート制限に当たる。
+見つけた (または作った) Webhook の id と token を メモリ → DB (webhook_cache) の順に覚えておき、
+通常は Webhook の実行1回だけで送信する。
+Webhook が消されたら on_webhooks_update か送信時の 404 で捨てて、次回取り直す。
+"""
+import asyncio
+import time
+
+import discord
+
+from utils.cache import LRUCache
+
+WEBHOOK_NAME = "RumiaFake"
+UPDATE_GRACE = 10 # 自分で取得・作成した直後の webhooks_update (自分の操作の通知) は無視する (秒)
+
+class WebhookCache:
+    def __init__(self, db, client, maxsize=10_000):
+        self.db = db
+        self.client = client
+        self.hooks = LRUCache(maxsize=maxsize) # channel_id -> (Webhook, 取得時刻)
+        self._loading = {} # channel_id -> 取得中のTask (同時に2つ作らないようにまとめる)
+
+        # メトリクス
+        self.db_hits = 0
+        self.fetches = 0
+        self.creates = 0
+        self.invalidations = 0
+
+    async def get(self, channel):
+        entry = self.hooks.get(channel.id)
+        if entry is not None:
+            return entry[0]
+        task = self._loading.get(channel.id)
+        if task is None:
+            task = self._loading[channel.id] = asyncio.create_task(self._load(channel))
+        return await task
+
+    async def _load(self, channel):
+        try:
+            row = await self.db.fetchrow("webhooks.get", channel.id)
+            if row:
+                self.db_hits += 1
+                webhook = discord.Webhook.partial(row['webhook_id'], row['token'], client=self.client)
+            else:
+                webhook = await self._fetch(channel)
+                await self.db.execute("webhooks.set", channel.id, channel.guild.id, webhook.id, webhook.token)
+            self.hooks.set(channel.id, (webhook, time.monotonic()))
+            return webhook
+        finally:
+            self._loading.pop(channel.id, None)
+
+    async def _fetch(self, channel):
+        """REST で既存の Webhook を探し、無ければ作る"""
+        self.fetches += 1
+        for webhook in await channel.webhooks():
+            if webhook.name == WEBHOOK_NAME and webhook.token:
+                return webhook
+        self.creates += 1
+        return await channel.create_webhook(name=WEBHOOK_NAME)
+
+    async def invalidate(self, channel_id):
+        self.invalidations += 1
+        self.hooks.pop(channel_id)
+        await self.db.execute("webhooks.delete", channel_id)
+
+    async def on_webhooks_update(self, channel):
+        entry = self.hooks.peek(channel.id)
+        if entry is not None and time.monotonic() - entry[1] < UPDATE_GRACE:
+            return
+        await self.invalidate(channel.id)
+
+    def stats(self):
+        return {
+            "db_hits": self.db_hits,
+            "fetches": self.fetches,
+            "creates": self.creates,
+            "invalidations": self.invalidations,
+            **self.hooks.stats(),
+        }
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+class BalanceBuffer:
+    """現金の増減をメモリに貯めて、まとめてDBに書き込むバッファ (write-behind)
+
+    interval 秒ごと、または max_ops 件たまった時点で1つのSQLでまとめて反映する。
+    書き込み後に on_flush(batch, started, rows) を呼ぶ
+    (started は書き込み開始時の perf_counter、rows は書き込み後の id, cash, bank)。
+    書き込み中の分 (inflight) も on_flush が終わるまでは get() に含める。
+    """
+
+    def __init__(self, db, interval=0.25, max_ops=500, on_flush=None):
+        self.db = db
+        self.on_flush = on_flush
+        self.interval = interval
+        self.max_ops = max_ops
+        self.pending = {} # user_id -> 未反映の現金増減
+        self.inflight = {} # user_id -> 書き込み中の現金増減 (DBにもキャッシュにもまだ反映されていない)
+        self.ops = 0
+        self.task = None
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+
+        # メトリクス
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.max_batch = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.failures = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """バックグラウンド処理を止め、残りを確実に書き込む"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    def add(self, user_id, delta):
+        self.pending[user_id] = self.pending.get(user_id, 0) + delta
+        self.ops += 1
+        if self.ops >= self.max_ops:
+            self.wakeup.set()
+
+    def get(self, user_id):
+        return self.pending.get(user_id, 0) + self.inflight.get(user_id, 0)
+
+    @property
+    def flushing(self):
+        return bool(self.inflight)
+
+    async def wait_flushed(self):
+        """書き込み中のバッチがあれば終わるまで待つ"""
+        if self.lock.locked():
+            async with self.lock:
+                pass
+
+    def take(self, user_id):
+        """未反映分を取り出す (呼び出し側のSQLで一緒に反映する場合に使う)"""
+        return self.pending.pop(user_id, 0)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"❌ 残高の書き込みに失敗しました: {e}")
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            self.inflight = batch
+            self.ops = 0
+            started = time.perf_counter()
+            try:
+                rows = await self.db.fetch("users.apply_deltas", list(batch.keys()), list(batch.values()))
+            except BaseException:
+                # 失敗・キャンセルされたら戻して次回に再試行
+                self.inflight = {}
+                for user_id, delta in batch.items():
+                    self.pending[user_id] = self.pending.get(user_id, 0) + delta
+                self.failures += 1
+                raise
+            elapsed = time.perf_counter() - started
+            try:
+                if self.on_flush:
+                    self.on_flush(batch, started, rows)
+            finally:
+                # キャッシュに反映し終えてから外す (間に await を挟まない)
+                self.inflight = {}
+            self.flushes += 1
+            self.flushed_rows += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            self.total_flush_time += elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+
+    def stats(self):
+        return {
+            "pending_users": len(self.pending),
+            "inflight_users": len(self.inflight),
+            "flushes": self.flushes,
+            "avg_batch": f"{self.flushed_rows / self.flushes if self.flushes else 0:.1f}",
+            "max_batch": self.max_batch,
+            "avg_flush": f"{(self.total_flush_time / self.flushes * 1000) if self.flushes else 0:.1f}ms",
+            "max_flush": f"{self.max_flush_time * 1000:.1f}ms",
+            "failures": self.failures,
+        }